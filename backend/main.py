@@ -2,7 +2,9 @@
 Main FastAPI application entry point.
 This app serves both the ADK agent API and the background worker endpoints.
 """
+import asyncio
 import structlog
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -25,6 +27,12 @@ async def lifespan(_: FastAPI):
     The underscore '_' indicates that we are intentionally not using the 'app'
     parameter passed by FastAPI.
     """
+    # Blocking work (GCS downloads, VCF parsing, pickling) goes through
+    # asyncio.to_thread, so one configurable pool serves all of it
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=settings.thread_pool_size)
+    )
+
     logger.info("Application startup: Initializing Google Cloud clients...")
     initialize_clients_and_runner()
     logger.info("Cloud clients initialized successfully.")
@@ -0,0 +1,70 @@
+"""Tests for the batched LLM prompts built during report generation."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import structlog
+
+from variants_coordinator.core import clients
+from variants_coordinator.services.report_generation_service import (
+    _MAX_GENES_PER_BATCH,
+    _MAX_VARIANTS_PER_BATCH,
+    _MAX_VARIANTS_PER_GENE_ENTRY,
+    ReportGenerationService,
+)
+
+
+def _variant(variant_id: str, gene: str, am_score=None, am_class=None) -> dict:
+    return {
+        "variant_id": variant_id,
+        "gene": gene,
+        "significance": "Likely Pathogenic (AI Predicted)",
+        "condition": None,
+        "category": "Cancer",
+        "source": "AlphaMissense",
+        "am_pathogenicity": am_score,
+        "am_class": am_class,
+    }
+
+
+class _RecordingModels:
+    """Stands in for genai_client.aio.models, keeping every prompt it is sent."""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def generate_content(self, model, contents, config):
+        self.prompts.append(contents)
+        return SimpleNamespace(text=json.dumps({"clinical_findings": [], "genes_in_batch": []}))
+
+
+def test_alphamissense_fields_reach_batch_prompt(monkeypatch):
+    models = _RecordingModels()
+    monkeypatch.setattr(clients, "genai_client", SimpleNamespace(aio=SimpleNamespace(models=models)))
+    service = ReportGenerationService.__new__(ReportGenerationService)
+
+    variants = [_variant("1-100-A-G", "BRCA1", am_score=0.91, am_class="likely_pathogenic")]
+    asyncio.run(service._generate_clinical_assessment(variants, structlog.get_logger(), "research"))
+
+    batch_prompt = models.prompts[0]
+    assert '"am_pathogenicity":0.91' in batch_prompt
+    assert '"am_class":"likely_pathogenic"' in batch_prompt
+
+
+def test_prompt_batches_are_bounded():
+    variants_by_gene = {"TTN": [_variant(f"2-{i}-A-G", "TTN") for i in range(300)]}
+    for n in range(25):
+        gene = f"GENE{n}"
+        variants_by_gene[gene] = [_variant(f"{n}-1-A-G", gene)]
+
+    batches = ReportGenerationService._build_prompt_batches(variants_by_gene)
+
+    entries = [entry for batch in batches for entry in batch]
+    assert sum(len(entry["variants"]) for entry in entries) == 325
+    for batch in batches:
+        assert len(batch) <= _MAX_GENES_PER_BATCH
+        assert sum(len(entry["variants"]) for entry in batch) < _MAX_VARIANTS_PER_BATCH + _MAX_VARIANTS_PER_GENE_ENTRY
+    ttn_entries = [entry for entry in entries if entry["gene"] == "TTN"]
+    assert all(len(entry["variants"]) <= _MAX_VARIANTS_PER_GENE_ENTRY for entry in ttn_entries)
+    assert all(entry["n_variants"] == 300 for entry in ttn_entries)
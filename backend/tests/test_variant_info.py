@@ -0,0 +1,66 @@
+"""Tests for the lazily parsed VCF INFO mapping on Variant."""
+
+import json
+import pickle
+import warnings
+
+from variants_coordinator.models.variant import LazyInfo, Variant
+from variants_coordinator.services.vcf_parser import VCFParser
+
+VCF_LINE = "chr1\t12345\trs1\tA\tG\t50\tPASS\tDP=10;DB;AF=0.5\tGT:GQ\t0/1:99"
+
+
+def _parsed_variant() -> Variant:
+    variant = VCFParser().parse_variant_line(VCF_LINE)
+    assert variant is not None
+    return variant
+
+
+def test_parser_keeps_info_lazy():
+    variant = _parsed_variant()
+    assert isinstance(variant.info, LazyInfo)
+    assert variant.info._parsed is None
+
+
+def test_model_dump_json_serializes_info():
+    variant = _parsed_variant()
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        dumped = json.loads(variant.model_dump_json())
+    assert dumped["info"] == {"DP": "10", "DB": True, "AF": "0.5"}
+
+
+def test_model_dump_returns_plain_dict_without_warnings():
+    variant = _parsed_variant()
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        info = variant.model_dump()["info"]
+    assert type(info) is dict
+    assert info["DP"] == "10"
+
+
+def test_pickle_round_trip_keeps_lazy_info():
+    unparsed = pickle.loads(pickle.dumps(_parsed_variant()))
+    assert isinstance(unparsed.info, LazyInfo)
+    assert unparsed.info["AF"] == "0.5"
+
+    variant = _parsed_variant()
+    variant.info.update({"GENE": "BRCA1"})
+    restored = pickle.loads(pickle.dumps(variant))
+    assert isinstance(restored.info, LazyInfo)
+    assert dict(restored.info) == {"DP": "10", "DB": True, "AF": "0.5", "GENE": "BRCA1"}
+
+
+def test_plain_dict_info_still_validates():
+    variant = Variant(chrom="1", pos=1, ref="A", alt=["T"], info={"GENE": "TP53"})
+    assert variant.info == {"GENE": "TP53"}
+    assert json.loads(variant.model_dump_json())["info"] == {"GENE": "TP53"}
+
+
+def test_get_and_contains_on_missing_keys():
+    info = _parsed_variant().info
+    assert info.get("AM_score") is None
+    assert info.get("AM_score", 0.0) == 0.0
+    assert info.get("DP") == "10"
+    assert "DB" in info
+    assert "GENE" not in info
@@ -24,6 +24,7 @@ New in v3.3:
 
 from typing import List, Set, Dict, Optional
 from enum import Enum
+from functools import lru_cache
 import structlog
 
 logger = structlog.get_logger(__name__)
@@ -156,6 +157,13 @@ ACMG_GENES_BY_CATEGORY: Dict[GeneCategory, Set[str]] = {
     }
 }
 
+# Reverse index for O(1) category lookup
+GENE_TO_CATEGORY: Dict[str, GeneCategory] = {
+    gene: category
+    for category, genes in ACMG_GENES_BY_CATEGORY.items()
+    for gene in genes
+}
+
 # Genes requiring special handling (autosomal recessive - need 2 pathogenic variants)
 RECESSIVE_GENES: Set[str] = {
     "MUTYH",  # MUTYH-associated polyposis
@@ -186,6 +194,7 @@ def is_acmg_gene(gene_symbol: str) -> bool:
     return gene_symbol.upper() in ACMG_SF_V3_3_GENES
 
 
+@lru_cache(maxsize=256)
 def get_gene_category(gene_symbol: str) -> Optional[GeneCategory]:
     """
     Get the category for an ACMG gene.
@@ -199,11 +208,7 @@ def get_gene_category(gene_symbol: str) -> Optional[GeneCategory]:
     if not gene_symbol:
         return None
 
-    gene_upper = gene_symbol.upper()
-    for category, genes in ACMG_GENES_BY_CATEGORY.items():
-        if gene_upper in genes:
-            return category
-    return None
+    return GENE_TO_CATEGORY.get(gene_symbol.upper())
 
 
 def requires_two_variants(gene_symbol: str) -> bool:
@@ -253,13 +258,17 @@ def filter_variants_to_acmg_genes(variants: List, gene_field: str = "GENE") -> L
     """
     filtered = []
     genes_found = set()
+    acmg_genes = ACMG_SF_V3_3_GENES
 
+    # Inline the is_acmg_gene check: this runs once per variant over whole-exome inputs
     for variant in variants:
-        if hasattr(variant, 'info') and variant.info:
-            gene = variant.info.get(gene_field)
-            if gene and is_acmg_gene(gene):
-                filtered.append(variant)
-                genes_found.add(gene.upper())
+        info = getattr(variant, 'info', None)
+        if not info:
+            continue
+        gene = info.get(gene_field)
+        if gene and (gene_upper := gene.upper()) in acmg_genes:
+            filtered.append(variant)
+            genes_found.add(gene_upper)
 
     logger.info(
         f"Filtered {len(variants)} variants to {len(filtered)} in ACMG genes",
@@ -1,5 +1,6 @@
 """Application configuration."""
 
+import os
 from pydantic_settings import BaseSettings
 from typing import Optional
 
@@ -32,6 +33,9 @@ class Settings(BaseSettings):
     max_variants_per_batch: int = 1000
     enable_caching: bool = True
 
+    # Default asyncio executor, shared by all to_thread/run_in_executor calls
+    thread_pool_size: int = min(32, (os.cpu_count() or 1) * 4)
+
     # External API URLs
     clinvar_api_url: str = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
     gnomad_api_url: str = "https://gnomad.broadinstitute.org/api"
@@ -27,7 +27,8 @@ def initialize_clients_and_runner():
         initialize_firebase_and_clients()
 
         # 2. Initialize the remaining Google Cloud clients
-        clients.tasks_client = tasks_v2.CloudTasksClient()
+        # Async client, so dispatching a task doesn't block the event loop
+        clients.tasks_client = tasks_v2.CloudTasksAsyncClient()
         logger.info("Successfully initialized Cloud Tasks client.")
 
         # 3. Initialize the Gemini client
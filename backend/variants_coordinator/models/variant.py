@@ -1,11 +1,99 @@
 """Variant data models for the ADK agent."""
 
 import pickle
+import sys
+from collections.abc import MutableMapping
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Annotated, Any, Dict, Iterator, List, Optional
 
 from google.genai.types import Blob, Part
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PlainSerializer, WrapValidator, field_validator
+
+
+class LazyInfo(MutableMapping):
+    """
+    VCF INFO column that is only split into key/value pairs on first access.
+
+    Most variants never have their raw INFO fields read, so the parser attaches
+    this instead of building a dict per line. Pickles as the raw string until
+    parsed, and as the parsed dict afterwards; it is a LazyInfo either way.
+    """
+    __slots__ = ("_raw", "_parsed")
+
+    def __init__(self, raw: str):
+        self._raw = raw
+        self._parsed: Optional[Dict[str, Any]] = None
+
+    def _data(self) -> Dict[str, Any]:
+        if self._parsed is None:
+            parsed = {}
+            if self._raw != ".":
+                intern = sys.intern
+                for item in self._raw.split(";"):
+                    key, sep, value = item.partition("=")
+                    parsed[intern(key)] = value if sep else True
+            self._parsed = parsed
+        return self._parsed
+
+    def __getitem__(self, key: str) -> Any:
+        return self._data()[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._data()[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        del self._data()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data())
+
+    def __len__(self) -> int:
+        return len(self._data())
+
+    # Direct dict lookups; the mixin versions raise and catch KeyError on every miss
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._data().get(key, default)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._data()
+
+    def update(self, *args, **kwargs) -> None:
+        # dict.update in one call, instead of the mixin's per-key __setitem__
+        self._data().update(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        return repr(self._data())
+
+    def __reduce__(self):
+        if self._parsed is None:
+            return LazyInfo, (self._raw,)
+        return LazyInfo._from_parsed, (self._parsed,)
+
+    @classmethod
+    def _from_parsed(cls, parsed: Dict[str, Any]) -> "LazyInfo":
+        info = cls.__new__(cls)
+        info._raw = None
+        info._parsed = parsed
+        return info
+
+
+def _info_as_dict(value: Any) -> Dict[str, Any]:
+    return dict(value)
+
+
+def _keep_lazy_info(value: Any, handler) -> Any:
+    """Accept a LazyInfo as is, so validation doesn't force the INFO column to be parsed."""
+    if isinstance(value, LazyInfo):
+        return value
+    return handler(value)
+
+
+# INFO mapping: a plain dict, or a LazyInfo from the VCF parser; always serialized as a dict
+InfoDict = Annotated[
+    Dict[str, Any],
+    WrapValidator(_keep_lazy_info),
+    PlainSerializer(_info_as_dict, return_type=Dict[str, Any]),
+]
 
 
 class Variant(BaseModel):
@@ -18,10 +106,18 @@ class Variant(BaseModel):
     filter: Optional[List[str]] = Field(None, description="Filter status")
     genotype: Optional[str] = Field(None, description="Sample genotype")
     genotype_quality: Optional[float] = Field(None, description="Genotype quality")
-    info: Dict[str, Any] = Field(default_factory=dict, description="INFO field data")
+    info: InfoDict = Field(default_factory=dict, description="INFO field data")
     variant_id: Optional[str] = Field(None, description="Variant identifier")
     variant_type: Optional[str] = Field(None, description="Type of variant (SNV, INDEL, etc)")
 
+    @field_validator("alt", mode="before")
+    @classmethod
+    def _coerce_alt_list(cls, value: Any) -> Any:
+        """Accept a single alternate allele string so downstream code always sees a list."""
+        if isinstance(value, str):
+            return [value]
+        return value
+
     def __init__(self, **data):
         super().__init__(**data)
         if not self.variant_id:
@@ -62,7 +158,8 @@ class VariantAnnotation(BaseModel):
 
 def serialize_data_to_artifact(data: Any) -> Part:
     """Serialize any Python object into an ADK Part for artifact storage using pickle."""
-    data_bytes = pickle.dumps(data)
+    # Protocol 5 frames large payloads more efficiently; loads() still reads older artifacts
+    data_bytes = pickle.dumps(data, protocol=5)
     return Part(inline_data=Blob(mime_type="application/python-pickle", data=data_bytes))
 
 
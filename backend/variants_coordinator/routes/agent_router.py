@@ -1,6 +1,7 @@
 """
 API routes for interacting with the ADK agent.
 """
+import asyncio
 import uuid
 import re
 from typing import Optional, Dict, Any
@@ -115,7 +116,6 @@ async def run_agent(
             invocation_id=str(uuid.uuid4()),
             actions=EventActions(state_delta=initial_state_delta)
         )
-        await adk.runner.session_service.append_event(session=session, event=setup_event)
 
         # Create Firestore metadata for new session
         metadata_service = SessionMetadataService(clients.db)
@@ -136,7 +136,11 @@ async def run_agent(
         if request.analysis_mode:
             metadata_kwargs["analysis_mode"] = request.analysis_mode
 
-        await metadata_service.create_metadata(**metadata_kwargs)
+        # The ADK session state and the Firestore metadata are independent stores
+        await asyncio.gather(
+            adk.runner.session_service.append_event(session=session, event=setup_event),
+            metadata_service.create_metadata(**metadata_kwargs)
+        )
 
     else:
         # For existing sessions, update analysis mode if provided
@@ -147,13 +151,15 @@ async def run_agent(
                 invocation_id=str(uuid.uuid4()),
                 actions=EventActions(state_delta={'analysis_mode': request.analysis_mode})
             )
-            await adk.runner.session_service.append_event(session=session, event=mode_update_event)
 
-            # Update metadata
+            # Update state and metadata concurrently
             metadata_service = SessionMetadataService(clients.db)
-            await metadata_service.update_metadata(
-                session_id=session.id,
-                analysis_mode=request.analysis_mode
+            await asyncio.gather(
+                adk.runner.session_service.append_event(session=session, event=mode_update_event),
+                metadata_service.update_metadata(
+                    session_id=session.id,
+                    analysis_mode=request.analysis_mode
+                )
             )
 
     user_message = Content(parts=[Part(text=request.input_text)], role="user")
@@ -178,24 +184,30 @@ async def run_agent(
 async def list_sessions(
         limit: int = Query(default=20, ge=1, le=100),
         offset: int = Query(default=0, ge=0),
+        cursor: Optional[str] = Query(default=None),
         current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """List all sessions for the authenticated user with metadata."""
     firebase_uid = current_user.get("uid")
 
     metadata_service = SessionMetadataService(clients.db)
-    sessions = await metadata_service.list_user_sessions(
-        firebase_uid=firebase_uid,
-        limit=limit,
-        offset=offset
-    )
+    try:
+        sessions, next_cursor = await metadata_service.list_user_sessions(
+            firebase_uid=firebase_uid,
+            limit=limit,
+            offset=offset,
+            cursor=cursor
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
 
     return {
         "status": "success",
         "sessions": sessions,
         "count": len(sessions),
         "limit": limit,
-        "offset": offset
+        "offset": offset,
+        "next_cursor": next_cursor
     }
 
 
@@ -4,6 +4,8 @@ Service layer for extracting and processing visualization data from annotations.
 
 from typing import Dict, Any, List, Optional
 from collections import Counter, defaultdict
+from operator import attrgetter, itemgetter
+import heapq
 import math
 import structlog
 
@@ -14,6 +16,30 @@ from ..core.acmg_genes import (
 
 logger = structlog.get_logger(__name__)
 
+# Resolved once at import instead of a hasattr() probe per annotation
+_HAS_IMPACT = "impact" in VariantAnnotation.model_fields
+_get_impact = attrgetter("impact") if _HAS_IMPACT else (lambda annotation: None)
+
+
+def _classify_sig(significance: Optional[str]) -> str:
+    """Normalize a clinical significance string into a chart category."""
+    if not significance:
+        return "Not Provided"
+
+    sig_lower = significance.lower()
+    if "pathogenic" in sig_lower and "likely" not in sig_lower:
+        return "Pathogenic"
+    elif "likely pathogenic" in sig_lower:
+        return "Likely Pathogenic"
+    elif "uncertain" in sig_lower or "vus" in sig_lower:
+        return "VUS"
+    elif "likely benign" in sig_lower:
+        return "Likely Benign"
+    elif "benign" in sig_lower and "likely" not in sig_lower:
+        return "Benign"
+    else:
+        return "Other"
+
 
 class ChartDataService:
     """
@@ -46,15 +72,8 @@ class ChartDataService:
         Returns:
             List of dictionaries with chromosome and count data
         """
-        chrom_counts = Counter()
-
-        for variant_id in self.annotations:
-            # Extract chromosome from variant_id (format: chr:pos:ref>alt)
-            try:
-                chrom = variant_id.split(':')[0]
-                chrom_counts[chrom] += 1
-            except:
-                continue
+        # Extract chromosome from variant_id (format: chr:pos:ref>alt)
+        chrom_counts = Counter(variant_id.partition(':')[0] for variant_id in self.annotations)
 
         # Sort chromosomes naturally (1-22, X, Y)
         sorted_chroms = []
@@ -151,7 +170,6 @@ class ChartDataService:
         Returns:
             Impact distribution data
         """
-        impact_counts = Counter()
         impact_map = {
             "HIGH": "High Impact",
             "MODERATE": "Moderate Impact",
@@ -159,17 +177,10 @@ class ChartDataService:
             "MODIFIER": "Modifier"
         }
 
-        for annotation in self.annotations.values():
-            # Try to get impact from annotation
-            # This would come from VEP data if available
-            impact = None
-            if hasattr(annotation, 'impact'):
-                impact = annotation.impact
-
-            if impact:
-                impact_counts[impact] += 1
-            else:
-                impact_counts["Unknown"] += 1
+        # Impact would come from VEP data if available
+        impact_counts = Counter(
+            _get_impact(annotation) or "Unknown" for annotation in self.annotations.values()
+        )
 
         chart_data = []
         for impact in ["HIGH", "MODERATE", "LOW", "MODIFIER", "Unknown"]:
@@ -190,28 +201,9 @@ class ChartDataService:
         Returns:
             Clinical significance distribution data
         """
-        sig_counts = Counter()
-
-        for annotation in self.annotations.values():
-            if annotation.clinical_significance:
-                # Normalize significance categories
-                sig_lower = annotation.clinical_significance.lower()
-                if "pathogenic" in sig_lower and "likely" not in sig_lower:
-                    category = "Pathogenic"
-                elif "likely pathogenic" in sig_lower:
-                    category = "Likely Pathogenic"
-                elif "uncertain" in sig_lower or "vus" in sig_lower:
-                    category = "VUS"
-                elif "likely benign" in sig_lower:
-                    category = "Likely Benign"
-                elif "benign" in sig_lower and "likely" not in sig_lower:
-                    category = "Benign"
-                else:
-                    category = "Other"
-
-                sig_counts[category] += 1
-            else:
-                sig_counts["Not Provided"] += 1
+        sig_counts = Counter(
+            _classify_sig(annotation.clinical_significance) for annotation in self.annotations.values()
+        )
 
         # Order by clinical importance
         ordered_categories = [
@@ -278,17 +270,18 @@ class ChartDataService:
         Returns:
             List of variant data sorted by frequency (descending)
         """
-        variant_freq_list = []
-
-        for variant_id, freq_data in self.frequencies.items():
-            if variant_id not in self.annotations:
-                continue
+        candidates = (
+            (variant_id, annotation, af)
+            for variant_id, freq_data in self.frequencies.items()
+            if (annotation := self.annotations.get(variant_id)) is not None
+            and (af := freq_data.get("af", 0)) > 0
+        )
 
-            af = freq_data.get("af", 0)
-            if af <= 0:
-                continue
+        # Partial selection of the top N instead of sorting every variant
+        top_variants = heapq.nlargest(limit, candidates, key=itemgetter(2))
 
-            annotation = self.annotations[variant_id]
+        variant_freq_list = []
+        for variant_id, annotation, af in top_variants:
             gene = annotation.gene_symbol or "Unknown"
             significance = annotation.clinical_significance or "Unknown"
 
@@ -310,9 +303,7 @@ class ChartDataService:
                 "category": "frequency"
             })
 
-        # Sort by frequency descending and take top N
-        variant_freq_list.sort(key=lambda x: x["value"], reverse=True)
-        return variant_freq_list[:limit]
+        return variant_freq_list
 
     def get_frequency_histogram(self, bins: int = 10) -> List[Dict[str, Any]]:
         """
@@ -412,15 +403,15 @@ class ChartDataService:
         # Select variants with frequency data
         variants_with_freq = []
         for variant_id, annotation in self.annotations.items():
-            if variant_id in self.frequencies:
-                freq_data = self.frequencies[variant_id]
+            freq_data = self.frequencies.get(variant_id)
+            if freq_data is not None:
                 # Check if any population frequency exists
                 has_pop_freq = any(
                     freq_data.get(pop_mapping[pop], 0) > 0
                     for pop in populations
                 )
                 if has_pop_freq:
-                    variants_with_freq.append((variant_id, annotation))
+                    variants_with_freq.append((variant_id, annotation, freq_data))
 
         # Limit variants
         variants_with_freq = variants_with_freq[:limit]
@@ -429,14 +420,14 @@ class ChartDataService:
         rows = []  # Variant labels
         values = []  # 2D frequency matrix
 
-        for variant_id, annotation in variants_with_freq:
+        for variant_id, annotation, freq_data in variants_with_freq:
             # Create variant label
             gene = annotation.gene_symbol or "Unknown"
-            label = f"{gene} ({variant_id.split(':')[0]}:{variant_id.split(':')[1]})"
-            rows.append(label)
+            chrom, _, rest = variant_id.partition(':')
+            pos = rest.partition(':')[0]
+            rows.append(f"{gene} ({chrom}:{pos})")
 
             # Get frequencies for each population
-            freq_data = self.frequencies[variant_id]
             variant_freqs = []
             for pop in populations:
                 freq_key = pop_mapping[pop]
@@ -472,8 +463,8 @@ class ChartDataService:
         scatter_data = []
 
         for variant_id, annotation in self.annotations.items():
-            if variant_id in self.frequencies:
-                freq_data = self.frequencies[variant_id]
+            freq_data = self.frequencies.get(variant_id)
+            if freq_data is not None:
                 af = freq_data.get("af", 0)
 
                 if af > 0:  # Only include variants with known frequency
@@ -18,11 +18,16 @@ class ClinVarClient:
     def __init__(self):
         self.local_clinvar = LocalClinVarService()
         self.base_url = settings.clinvar_api_url
-        self.client = httpx.AsyncClient(timeout=30.0)
+        # HTTP/2 multiplexes the concurrent E-utils requests over one pooled connection
+        self.client = httpx.AsyncClient(
+            timeout=30.0,
+            http2=True,
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=10)
+        )
 
     async def batch_annotate(self, variants: List[Variant]) -> Dict[str, VariantAnnotation]:
         """Annotate multiple variants with ClinVar data."""
-        if self.local_clinvar.is_loaded():
+        if await self.local_clinvar.is_loaded():
             logger.info("Using pre-loaded local ClinVar database for batch annotation.")
             return await self.local_clinvar.batch_annotate(variants)
 
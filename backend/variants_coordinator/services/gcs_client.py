@@ -1,6 +1,8 @@
 """Google Cloud Storage client for VCF file access."""
 
 import gzip
+import io
+from typing import Iterator
 from google.cloud import storage
 from google.cloud.exceptions import NotFound
 import structlog
@@ -63,3 +65,27 @@ class GCSClient:
         except Exception as e:
             logger.exception("Error reading VCF file from GCS.")
             raise GCSAccessError(f"An unexpected error occurred while reading from GCS: {e}")
+
+    def iter_vcf_lines(self, gcs_path: str) -> Iterator[str]:
+        """Stream VCF lines from GCS, decompressing on the fly if needed."""
+        logger.info("Streaming VCF from GCS", gcs_path=gcs_path)
+
+        if not self.client:
+            raise GCSAccessError("GCS client is not available.")
+
+        try:
+            bucket_name, blob_name = self._parse_gcs_path(gcs_path)
+            bucket = self.client.bucket(bucket_name)
+            blob = bucket.blob(blob_name)
+
+            with blob.open("rb") as raw:
+                stream = gzip.GzipFile(fileobj=raw) if gcs_path.endswith(".gz") else raw
+                with io.TextIOWrapper(stream, encoding='utf-8') as text:
+                    yield from text
+
+        except NotFound:
+            logger.error("File not found in GCS", gcs_path=gcs_path)
+            raise GCSAccessError(f"File not found at GCS path: {gcs_path}")
+        except Exception as e:
+            logger.exception("Error streaming VCF file from GCS.")
+            raise GCSAccessError(f"An unexpected error occurred while reading from GCS: {e}")
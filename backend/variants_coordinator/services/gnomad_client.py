@@ -1,23 +1,62 @@
 import asyncio
-from typing import Dict, List
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import pyarrow
+from cachetools import TTLCache
+import google.auth
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import bigquery
+from requests.adapters import HTTPAdapter
 import structlog
 from ..models.variant import Variant
 
 logger = structlog.get_logger(__name__)
 
+# Frequency lookups keyed by (prefer_v3_only, chrom, pos, ref, alt), shared across client
+# instances since a new client is created per report run. Entries are private copies of
+# the returned dicts; None marks a variant not in gnomAD.
+_FREQUENCY_CACHE: TTLCache = TTLCache(maxsize=500_000, ttl=86400)
+
+# Chromosomes with gnomAD tables
+_VALID_CHROMS = frozenset([str(i) for i in range(1, 23)] + ['X', 'Y'])
+
+# Query templates; only the chromosome is formatted in, variant keys are bound as @keys
+_QUERY_V3_TEMPLATE = """SELECT 'v3' as source, start_position, reference_bases, alternate_bases.alt, alternate_bases.AF as af, alternate_bases.AC as ac, main_table.AN as an, alternate_bases.AF_afr as af_afr, alternate_bases.AF_nfe as af_nfe, alternate_bases.AF_eas as af_eas, alternate_bases.AF_amr as af_amr, alternate_bases.AF_fin as af_fin, alternate_bases.AF_asj as af_asj, alternate_bases.AF_sas as af_sas, alternate_bases.AF_oth as af_oth, alternate_bases.nhomalt as hom_count FROM `bigquery-public-data.gnomAD.v3_genomes__chr{chrom}` AS main_table, main_table.alternate_bases AS alternate_bases JOIN UNNEST(@keys) AS k ON k.pos = main_table.start_position AND k.ref = main_table.reference_bases AND k.alt = alternate_bases.alt"""
+
+# Note: v2 doesn't have AF_sas field, it was added in v3
+_QUERY_V2_TEMPLATE = """SELECT 'v2' as source, start_position, reference_bases, alternate_bases.alt, alternate_bases.AF as af, alternate_bases.AC as ac, main_table.AN as an, alternate_bases.AF_afr as af_afr, alternate_bases.AF_nfe as af_nfe, alternate_bases.AF_eas as af_eas, alternate_bases.AF_amr as af_amr, alternate_bases.AF_fin as af_fin, alternate_bases.AF_asj as af_asj, alternate_bases.AF_oth as af_oth, alternate_bases.nhomalt as hom_count FROM `bigquery-public-data.gnomAD.v2_1_1_genomes__chr{chrom}` AS main_table, main_table.alternate_bases AS alternate_bases JOIN UNNEST(@keys) AS k ON k.pos = main_table.start_position AND k.ref = main_table.reference_bases AND k.alt = alternate_bases.alt"""
+
 
 class GnomADClient:
     """Query gnomAD data from BigQuery public datasets."""
 
-    def __init__(self):
+    # Variants per query; BigQuery's per-query fixed cost and 10 MB billing minimum
+    # dominate small batches, and keys are bound as parameters so query text stays small
+    BATCH_SIZE = 500
+
+    def __init__(self, prefer_v3_only: bool = False, max_concurrency: int = 8):
+        # When set, skip the concurrent v2 query and return v3 hits only
+        self.prefer_v3_only = prefer_v3_only
+        # Upper bound on batch queries in flight at once
+        self.max_concurrency = max_concurrency
+        # Each batch runs the v3 and (unless v3-only) v2 queries at once, so this many
+        # BigQuery requests can be in flight; the thread and connection pools match it
+        max_requests = max_concurrency if prefer_v3_only else 2 * max_concurrency
+        # Dedicated pool so BigQuery calls don't queue behind other work on the default executor
+        self._executor = ThreadPoolExecutor(max_workers=max_requests, thread_name_prefix="bq")
         try:
-            self.client = bigquery.Client()
+            credentials, project = google.auth.default(scopes=bigquery.Client.SCOPE)
+            self.client = bigquery.Client(
+                project=project,
+                credentials=credentials,
+                _http=self._sized_http_session(credentials, max_requests)
+            )
             logger.info("BigQuery client initialized for gnomAD queries")
         except Exception as e:
             logger.error(f"Failed to initialize BigQuery client: {e}")
             self.client = None
-        self.cache = {}  # Cache results to avoid repeated queries
+        self.cache = _FREQUENCY_CACHE  # Cache results to avoid repeated queries
 
     async def batch_query_frequencies(self, variants: List[Variant]) -> Dict[str, Dict]:
         """
@@ -36,221 +75,242 @@ class GnomADClient:
             logger.warning(f"Limiting gnomAD query to first {MAX_VARIANTS} variants")
             variants = variants[:MAX_VARIANTS]
 
+        results = {}
+        cache_hits = 0
+        invalid_variants = []
+
         # Group by chromosome for efficient querying
         variants_by_chrom = {}
         for v in variants:
-            chrom = str(v.chrom).replace('chr', '')
+            chrom = str(v.chrom).removeprefix('chr')
             # Skip non-standard chromosomes
-            if chrom not in [str(i) for i in range(1, 23)] + ['X', 'Y']:
+            if chrom not in _VALID_CHROMS:
                 continue
-            if chrom not in variants_by_chrom:
-                variants_by_chrom[chrom] = []
-            variants_by_chrom[chrom].append(v)
 
-        results = {}
-        total_batches = sum((len(chrom_vars) - 1) // 100 + 1 for chrom_vars in variants_by_chrom.values())
-        current_batch = 0
+            variant_key = self._variant_key(v)
+            if variant_key is None:
+                invalid_variants.append(v.variant_id)
+                continue
+
+            # Serve previously seen variants (including known misses) from cache
+            cache_key = (self.prefer_v3_only, chrom, *variant_key)
+            if cache_key in self.cache:
+                cache_hits += 1
+                cached = self.cache[cache_key]
+                if cached is not None:
+                    results[v.variant_id] = dict(cached)
+                continue
 
-        for chrom, chrom_variants in variants_by_chrom.items():
-            # Process in batches of 100 to avoid query size limits
-            for i in range(0, len(chrom_variants), 100):
-                batch = chrom_variants[i:i + 100]
-                current_batch += 1
-                logger.info(f"Processing batch {current_batch}/{total_batches} for chromosome {chrom}")
+            # Keep the normalized key with the id so batches never re-normalize
+            if chrom not in variants_by_chrom:
+                variants_by_chrom[chrom] = []
+            variants_by_chrom[chrom].append((*variant_key, v.variant_id))
 
+        if invalid_variants:
+            logger.warning(
+                "Skipped variants with invalid positions",
+                count=len(invalid_variants),
+                examples=invalid_variants[:5]
+            )
+        if cache_hits:
+            logger.info("Served variants from gnomAD cache", count=cache_hits)
+
+        batch_size = self.BATCH_SIZE
+        all_batches = [
+            (chrom, chrom_variants[i:i + batch_size])
+            for chrom, chrom_variants in variants_by_chrom.items()
+            for i in range(0, len(chrom_variants), batch_size)
+        ]
+        total_batches = len(all_batches)
+        sem = asyncio.Semaphore(self.max_concurrency)
+
+        async def _guarded(batch_num: int, chrom: str, batch: List[Tuple[int, str, str, str]]) -> Dict[str, Dict]:
+            async with sem:
+                logger.info("Processing gnomAD batch", batch=batch_num, total=total_batches, chrom=chrom)
                 try:
-                    batch_results = await self._query_batch(chrom, batch)
-                    results.update(batch_results)
+                    return await self._query_batch(chrom, batch)
                 except Exception as e:
-                    logger.error(f"Failed to query batch for chromosome {chrom}: {e}")
+                    logger.error("Failed to query gnomAD batch", chrom=chrom, error=str(e))
                     # Continue with other batches
+                    return {}
 
-                # Yield control periodically
-                if i % 500 == 0:
-                    await asyncio.sleep(0)
+        # Bounded fan-out keeps BigQuery quota in check while merging results as they land
+        for coro in asyncio.as_completed([
+            _guarded(n, chrom, batch) for n, (chrom, batch) in enumerate(all_batches, 1)
+        ]):
+            results.update(await coro)
 
         logger.info(f"Retrieved frequency data for {len(results)} variants")
         return results
 
-    async def _query_batch(self, chrom: str, variants: List[Variant]) -> Dict[str, Dict]:
-        """Query a batch of variants on the same chromosome."""
-
-        # Build WHERE conditions with proper SQL escaping
-        conditions = []
-        variant_map = {}
-
-        for v in variants:
-            # Handle alt field - it might be a list
-            if isinstance(v.alt, list):
-                # Take the first alt allele if it's a list
-                alt_str = str(v.alt[0]) if v.alt else ''
-            else:
-                alt_str = str(v.alt)
-
-            # Handle ref field similarly (just in case)
-            if isinstance(v.ref, list):
-                ref_str = str(v.ref[0]) if v.ref else ''
-            else:
-                ref_str = str(v.ref)
-
-            # Map for result matching
-            key = f"{v.pos}:{ref_str}:{alt_str}"
-            variant_map[key] = v.variant_id
-
-            # SQL injection protection - use double quotes for escaping in BigQuery
-            ref_escaped = ref_str.replace("'", "''")
-            alt_escaped = alt_str.replace("'", "''")
-
-            try:
-                pos_int = int(v.pos)
-            except (ValueError, TypeError) as e:
-                logger.error(f"Invalid position for variant {v.variant_id}: {v.pos}, error: {e}")
-                continue
+    async def _query_batch(self, chrom: str, variants: List[Tuple[int, str, str, str]]) -> Dict[str, Dict]:
+        """
+        Query a batch of normalized (pos, ref, alt, variant_id) entries on the same chromosome.
+        v3 and v2 are queried concurrently; v3 results take precedence over v2.
+        """
 
-            # Build condition - ensure no line breaks within the condition
-            condition = f"(start_position = {pos_int} AND reference_bases = '{ref_escaped}' AND alternate_bases.alt = '{alt_escaped}')"
-            conditions.append(condition)
+        # Map (pos, ref, alt) keys for result matching; the keys also feed the UNNEST join as
+        # query parameters, so no SQL escaping is needed and the query text stays constant
+        variant_map = {(pos, ref, alt): variant_id for pos, ref, alt, variant_id in variants}
+        keys = list(variant_map)
 
-        if not conditions:
-            logger.warning(f"No valid conditions for chromosome {chrom}")
+        if not keys:
+            logger.warning("No valid variant keys for batch", chrom=chrom)
             return {}
 
-        # Join conditions with proper spacing
-        where_clause = " OR ".join(conditions)
+        # One keys parameter serves both queries; the client copies job configs per query
+        job_config = self._job_config(keys)
 
-        # Build query v3 using string format() method to completely avoid f-string issues
-        query_v3_template = """SELECT 'v3' as source, start_position, reference_bases, alternate_bases.alt, alternate_bases.AF as af, alternate_bases.AC as ac, main_table.AN as an, alternate_bases.AF_afr as af_afr, alternate_bases.AF_nfe as af_nfe, alternate_bases.AF_eas as af_eas, alternate_bases.AF_amr as af_amr, alternate_bases.AF_fin as af_fin, alternate_bases.AF_asj as af_asj, alternate_bases.AF_sas as af_sas, alternate_bases.AF_oth as af_oth, alternate_bases.nhomalt as hom_count FROM `bigquery-public-data.gnomAD.v3_genomes__chr{chrom}` AS main_table, main_table.alternate_bases AS alternate_bases WHERE {where_clause}"""
+        # Dispatch v2 alongside v3 rather than waiting to see what v3 misses
+        t_v3 = asyncio.create_task(self._run_query(_QUERY_V3_TEMPLATE.format(chrom=chrom), job_config))
+        if self.prefer_v3_only:
+            (outcome_v3,) = await asyncio.gather(t_v3, return_exceptions=True)
+            outcome_v2 = None
+        else:
+            t_v2 = asyncio.create_task(self._run_query(_QUERY_V2_TEMPLATE.format(chrom=chrom), job_config))
+            outcome_v3, outcome_v2 = await asyncio.gather(t_v3, t_v2, return_exceptions=True)
 
-        query_v3 = query_v3_template.format(chrom=chrom, where_clause=where_clause)
+        results = {}
 
-        try:
-            # Run v3 query asynchronously
-            loop = asyncio.get_event_loop()
-            query_job_v3 = await loop.run_in_executor(
-                None,
-                self.client.query,
-                query_v3
+        # Apply v2 first so v3 overwrites it on collision
+        if isinstance(outcome_v2, Exception):
+            logger.warning("v2 query failed", chrom=chrom, error=str(outcome_v2))
+        elif outcome_v2 is not None:
+            table_v2, bytes_v2 = outcome_v2
+            self._collect_frequencies(table_v2, variant_map, 'gnomAD_v2', results)
+
+            # Log v2 query cost
+            logger.info(
+                "v2 query processed",
+                chrom=chrom,
+                gb_billed=round(bytes_v2 / (1024 ** 3), 4),
+                bytes_per_variant=bytes_v2 // len(keys)
             )
-            rows_v3 = await loop.run_in_executor(None, query_job_v3.result)
-
-            results = {}
-            found_variants = set()
-
-            for row in rows_v3:
-                key = f"{row.start_position}:{row.reference_bases}:{row.alt}"
-                if key in variant_map:
-                    variant_id = variant_map[key]
-                    found_variants.add(variant_id)
-                    results[variant_id] = {
-                        'source': 'gnomAD_v3',
-                        'af': float(row.af) if row.af else 0,
-                        'ac': int(row.ac) if row.ac else 0,
-                        'an': int(row.an) if row.an else 0,
-                        'af_afr': float(row.af_afr) if row.af_afr else 0,
-                        'af_amr': float(row.af_amr) if row.af_amr else 0,
-                        'af_eas': float(row.af_eas) if row.af_eas else 0,
-                        'af_nfe': float(row.af_nfe) if row.af_nfe else 0,
-                        'af_fin': float(row.af_fin) if row.af_fin else 0,
-                        'af_asj': float(row.af_asj) if row.af_asj else 0,
-                        'af_sas': float(row.af_sas) if row.af_sas else 0,
-                        'af_oth': float(row.af_oth) if row.af_oth else 0,
-                        'hom_count': int(row.hom_count) if row.hom_count else 0
-                    }
-
-            # Check if we need to query v2 for missing variants
-            missing_variants = [v for v in variants if v.variant_id not in found_variants]
-
-            if missing_variants:
-                logger.info(f"Querying v2 for {len(missing_variants)} variants not found in v3")
-
-                # Build conditions for missing variants
-                conditions_v2 = []
-                for v in missing_variants:
-                    # Handle alt field - it might be a list
-                    if isinstance(v.alt, list):
-                        alt_str = str(v.alt[0]) if v.alt else ''
-                    else:
-                        alt_str = str(v.alt)
-
-                    # Handle ref field similarly
-                    if isinstance(v.ref, list):
-                        ref_str = str(v.ref[0]) if v.ref else ''
-                    else:
-                        ref_str = str(v.ref)
-
-                    ref_escaped = ref_str.replace("'", "''")
-                    alt_escaped = alt_str.replace("'", "''")
-
-                    try:
-                        pos_int = int(v.pos)
-                    except (ValueError, TypeError) as e:
-                        logger.error(f"Invalid position for variant {v.variant_id}: {v.pos}, error: {e}")
-                        continue
-
-                    condition = f"(start_position = {pos_int} AND reference_bases = '{ref_escaped}' AND alternate_bases.alt = '{alt_escaped}')"
-                    conditions_v2.append(condition)
-
-                if conditions_v2:  # Only query if we have valid conditions
-                    where_clause_v2 = " OR ".join(conditions_v2)
-
-                    # Build query v2 using string format() method
-                    # Note: v2 doesn't have AF_sas field, it was added in v3
-                    query_v2_template = """SELECT 'v2' as source, start_position, reference_bases, alternate_bases.alt, alternate_bases.AF as af, alternate_bases.AC as ac, main_table.AN as an, alternate_bases.AF_afr as af_afr, alternate_bases.AF_nfe as af_nfe, alternate_bases.AF_eas as af_eas, alternate_bases.AF_amr as af_amr, alternate_bases.AF_fin as af_fin, alternate_bases.AF_asj as af_asj, alternate_bases.AF_oth as af_oth, alternate_bases.nhomalt as hom_count FROM `bigquery-public-data.gnomAD.v2_1_1_genomes__chr{chrom}` AS main_table, main_table.alternate_bases AS alternate_bases WHERE {where_clause}"""
-
-                    query_v2 = query_v2_template.format(chrom=chrom, where_clause=where_clause_v2)
-
-                    try:
-                        query_job_v2 = await loop.run_in_executor(
-                            None,
-                            self.client.query,
-                            query_v2
-                        )
-                        rows_v2 = await loop.run_in_executor(None, query_job_v2.result)
-
-                        for row in rows_v2:
-                            key = f"{row.start_position}:{row.reference_bases}:{row.alt}"
-                            if key in variant_map:
-                                variant_id = variant_map[key]
-                                results[variant_id] = {
-                                    'source': 'gnomAD_v2',
-                                    'af': float(row.af) if row.af else 0,
-                                    'ac': int(row.ac) if row.ac else 0,
-                                    'an': int(row.an) if row.an else 0,
-                                    'af_afr': float(row.af_afr) if row.af_afr else 0,
-                                    'af_amr': float(row.af_amr) if row.af_amr else 0,
-                                    'af_eas': float(row.af_eas) if row.af_eas else 0,
-                                    'af_nfe': float(row.af_nfe) if row.af_nfe else 0,
-                                    'af_fin': float(row.af_fin) if row.af_fin else 0,
-                                    'af_asj': float(row.af_asj) if row.af_asj else 0,
-                                    'af_sas': 0,  # v2 doesn't have South Asian population data
-                                    'af_oth': float(row.af_oth) if row.af_oth else 0,
-                                    'hom_count': int(row.hom_count) if row.hom_count else 0
-                                }
-
-                        # Log v2 query cost
-                        gb_v2 = query_job_v2.total_bytes_billed / (1024 ** 3) if query_job_v2.total_bytes_billed else 0
-                        logger.info(f"v2 query processed {gb_v2:.4f} GB")
-
-                    except Exception as e:
-                        logger.warning(f"v2 query failed for chromosome {chrom}: {e}")
-
-            # Log summary
-            not_found = len(variants) - len(results)
-            if not_found > 0:
-                logger.info(f"Chr{chrom}: {len(results)} found, {not_found} not in gnomAD")
+
+        if isinstance(outcome_v3, Exception):
+            logger.error("BigQuery error for gnomAD batch", chrom=chrom, error=str(outcome_v3), exc_info=outcome_v3)
+        else:
+            table_v3, bytes_v3 = outcome_v3
+            self._collect_frequencies(table_v3, variant_map, 'gnomAD_v3', results)
 
             # Log v3 query cost
-            gb_v3 = query_job_v3.total_bytes_billed / (1024 ** 3) if query_job_v3.total_bytes_billed else 0
-            logger.info(f"v3 query processed {gb_v3:.4f} GB")
+            logger.info(
+                "v3 query processed",
+                chrom=chrom,
+                gb_billed=round(bytes_v3 / (1024 ** 3), 4),
+                bytes_per_variant=bytes_v3 // len(keys)
+            )
 
-            return results
+        # Only memoize when every queried source answered, so failures aren't cached as misses
+        if not isinstance(outcome_v3, Exception) and not isinstance(outcome_v2, Exception):
+            for (pos_int, ref_str, alt_str), variant_id in variant_map.items():
+                freq = results.get(variant_id)
+                self.cache[(self.prefer_v3_only, chrom, pos_int, ref_str, alt_str)] = (
+                    dict(freq) if freq is not None else None
+                )
 
-        except Exception as e:
-            logger.error(f"BigQuery error for chromosome {chrom}: {e}", exc_info=True)
-            # Return empty dict on error but log it
-            return {}
+        # Log summary
+        not_found = len(variants) - len(results)
+        if not_found > 0:
+            logger.info("gnomAD batch summary", chrom=chrom, found=len(results), not_found=not_found)
+
+        return results
+
+    @staticmethod
+    def _variant_key(v: Variant) -> Optional[Tuple[int, str, str]]:
+        """Normalize a variant to its (pos, ref, alt) lookup key, or None if invalid."""
+        # Variant guarantees ref is a str and alt a list, so no type dispatch is needed
+        alt_str = v.alt[0] if v.alt else ''
+        ref_str = v.ref
+
+        try:
+            pos_int = int(v.pos)
+        except (ValueError, TypeError):
+            # Callers report invalid variants in aggregate rather than per variant
+            return None
+
+        return pos_int, ref_str, alt_str
+
+    @staticmethod
+    def _collect_frequencies(table: pyarrow.Table, variant_map: Dict[Tuple[int, str, str], str],
+                             source: str, results: Dict[str, Dict]) -> None:
+        """Add frequency records for matched rows of a result table to results, keyed by variant_id."""
+        # Columns are converted once each instead of reading attributes row by row
+        columns = table.to_pydict()
+        n_rows = table.num_rows
+        # v2 doesn't have South Asian population data
+        missing = [None] * n_rows
+        for pos, ref, alt, af, ac, an, af_afr, af_amr, af_eas, af_nfe, af_fin, af_asj, af_sas, af_oth, hom_count in zip(
+                columns['start_position'], columns['reference_bases'], columns['alt'],
+                columns['af'], columns['ac'], columns['an'],
+                columns['af_afr'], columns['af_amr'], columns['af_eas'], columns['af_nfe'],
+                columns['af_fin'], columns['af_asj'], columns.get('af_sas', missing), columns['af_oth'],
+                columns['hom_count']):
+            variant_id = variant_map.get((pos, ref, alt))
+            if variant_id is None:
+                continue
+            results[variant_id] = {
+                'source': source,
+                'af': float(af) if af else 0,
+                'ac': int(ac) if ac else 0,
+                'an': int(an) if an else 0,
+                'af_afr': float(af_afr) if af_afr else 0,
+                'af_amr': float(af_amr) if af_amr else 0,
+                'af_eas': float(af_eas) if af_eas else 0,
+                'af_nfe': float(af_nfe) if af_nfe else 0,
+                'af_fin': float(af_fin) if af_fin else 0,
+                'af_asj': float(af_asj) if af_asj else 0,
+                'af_sas': float(af_sas) if af_sas else 0,
+                'af_oth': float(af_oth) if af_oth else 0,
+                'hom_count': int(hom_count) if hom_count else 0
+            }
+
+    async def _run_query(self, query: str, job_config: bigquery.QueryJobConfig) -> Tuple[pyarrow.Table, int]:
+        """Run a keyed query off the event loop; returns (Arrow result table, bytes billed)."""
+        loop = asyncio.get_event_loop()
+        query_job = await loop.run_in_executor(
+            self._executor,
+            functools.partial(self.client.query, query, job_config=job_config)
+        )
+        # Arrow fetch (Storage Read API when installed, for multi-page results) skips
+        # building a Row object per result
+        table = await loop.run_in_executor(
+            self._executor,
+            functools.partial(query_job.to_arrow, create_bqstorage_client=True)
+        )
+        return table, query_job.total_bytes_billed or 0
+
+    @staticmethod
+    def _job_config(keys: List[Tuple[int, str, str]]) -> bigquery.QueryJobConfig:
+        """Build a job config passing (pos, ref, alt) keys as an ARRAY<STRUCT> parameter."""
+        keys_param = bigquery.ArrayQueryParameter(
+            "keys",
+            "STRUCT",
+            [
+                bigquery.StructQueryParameter(
+                    None,
+                    bigquery.ScalarQueryParameter("pos", "INT64", pos),
+                    bigquery.ScalarQueryParameter("ref", "STRING", ref),
+                    bigquery.ScalarQueryParameter("alt", "STRING", alt),
+                )
+                for pos, ref, alt in keys
+            ]
+        )
+        return bigquery.QueryJobConfig(
+            query_parameters=[keys_param],
+            use_query_cache=True,
+            labels={"app": "gnomad"}
+        )
+
+    @staticmethod
+    def _sized_http_session(credentials, pool_size: int) -> AuthorizedSession:
+        """Authorized HTTP session whose connection pool matches our query concurrency."""
+        session = AuthorizedSession(credentials)
+        session.mount("https://", HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+        return session
 
     async def close(self):
         """Close the BigQuery client."""
-        self.cache.clear()
+        # The frequency cache is shared across instances and intentionally kept
+        self._executor.shutdown(wait=False)
         logger.info("gnomAD client closed")
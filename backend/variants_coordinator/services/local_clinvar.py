@@ -1,11 +1,24 @@
 """Local ClinVar database service using a downloaded VCF file."""
 
+import asyncio
 import gzip
 import os
-from typing import Dict, List
+import pickle
+import shutil
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
 import structlog
 from ..models.variant import Variant, VariantAnnotation
 
+try:
+    import pysam
+except ImportError:  # pysam is optional; fall back to the in-memory index
+    pysam = None
+
 logger = structlog.get_logger(__name__)
 
 
@@ -14,14 +27,23 @@ class LocalClinVarService:
 
     def __init__(self, clinvar_vcf_path: str = "data/clinvar.vcf.gz"):
         self.clinvar_path = clinvar_vcf_path
-        self.clinvar_index: Dict[str, Dict] = {}
+        # Keyed by (chrom, pos, ref, alt) -> (clinical_significance, gene_symbol)
+        self.clinvar_index: Dict[Tuple[str, int, str, str], Tuple[str, Optional[str]]] = {}
+        self.tabix = None
+        # Pre-built index persisted next to the VCF to skip re-parsing on cold start
+        self.index_cache_path = clinvar_vcf_path + ".idx.pkl"
         self._loaded = False
         self._load_attempted = False
+        self._load_task: Optional[asyncio.Task] = None
+        # Per-position lookups against the tabix index, memoized for recurring variants
+        self._fetch_position = lru_cache(maxsize=65536)(self._fetch_position_uncached)
 
-    def is_loaded(self) -> bool:
-        """Check if the ClinVar index is loaded in memory."""
-        if not self._load_attempted:
-            self.load_clinvar_index()
+    async def is_loaded(self) -> bool:
+        """Check if the ClinVar index is loaded, loading it off the event loop on first use."""
+        if self._load_task is None:
+            # Concurrent callers share the single load task instead of each triggering a load
+            self._load_task = asyncio.ensure_future(asyncio.to_thread(self.load_clinvar_index))
+        await self._load_task
         return self._loaded
 
     def load_clinvar_index(self):
@@ -34,29 +56,108 @@ class LocalClinVarService:
             logger.warning(f"Local ClinVar file not found, API will be used.", path=self.clinvar_path)
             return
 
+        # Prefer on-demand random access through the tabix index when available
+        if pysam is not None and os.path.exists(self.clinvar_path + ".tbi"):
+            try:
+                self.tabix = pysam.TabixFile(self.clinvar_path)
+                self._loaded = True
+                logger.info("Opened local ClinVar database with tabix index", path=self.clinvar_path)
+                return
+            except Exception:
+                logger.exception("Error opening ClinVar tabix index, loading into memory instead.")
+                self.tabix = None
+
+        if self._load_cached_index():
+            return
+
         logger.info("Loading local ClinVar database into memory...")
         try:
-            with gzip.open(self.clinvar_path, 'rt') as f:
+            # Binary mode avoids decoding every line; only the fields we keep are decoded
+            intern = sys.intern
+            with self._open_vcf() as f:
                 for line in f:
-                    if line.startswith('#'):
+                    if line[:1] == b'#':
                         continue
-                    fields = line.strip().split('\t')
-                    chrom, pos, _, ref, alts, _, _, info = fields[:8]
-
-                    info_dict = {i.split('=', 1)[0]: i.split('=', 1)[1] for i in info.split(';') if '=' in i}
-                    clnsig = self._parse_clnsig(info_dict.get('CLNSIG', ''))
-                    gene = info_dict.get('GENEINFO', ':').split(':')[0]
-
-                    for alt in alts.split(','):
-                        key = f"{chrom.replace('chr', '')}:{pos}:{ref}>{alt}"
-                        self.clinvar_index[key] = {
-                            'clinical_significance': clnsig,
-                            'gene_symbol': gene if gene else None
-                        }
+                    chrom, pos, _, ref, alts, _, _, info = line.rstrip().split(b'\t', 8)[:8]
+
+                    # Compact tuple values with interned strings: chromosomes, short
+                    # alleles and gene symbols repeat heavily across millions of records
+                    clnsig = self._classify_clnsig_bytes(self._info_value(info, b'CLNSIG'))
+                    gene = self._info_value(info, b'GENEINFO').split(b':', 1)[0].decode()
+                    value = (clnsig, intern(gene) if gene else None)
+
+                    chrom = intern(chrom.decode().replace('chr', ''))
+                    pos = int(pos)
+                    ref = intern(ref.decode())
+                    for alt in alts.decode().split(','):
+                        self.clinvar_index[(chrom, pos, ref, intern(alt))] = value
             self._loaded = True
             logger.info(f"Successfully loaded {len(self.clinvar_index)} variants from local ClinVar.")
         except Exception as e:
             logger.exception("Error loading local ClinVar database.")
+            self.clinvar_index = {}
+            return
+
+        self._save_cached_index()
+
+    @contextmanager
+    def _open_vcf(self) -> Iterator[BinaryIO]:
+        """Open the VCF for binary line iteration, decompressing in a zcat process when available."""
+        zcat = shutil.which("zcat")
+        if zcat is None:
+            with gzip.open(self.clinvar_path, 'rb') as f:
+                yield f
+            return
+
+        # Decompression runs on another core while this thread parses lines
+        proc = subprocess.Popen([zcat, self.clinvar_path], stdout=subprocess.PIPE, bufsize=1 << 20)
+        try:
+            yield proc.stdout
+        finally:
+            proc.stdout.close()
+            # A corrupt or truncated file must not be loaded (and cached) as a partial index
+            if proc.wait() not in (0, -13):  # -13: SIGPIPE if we stopped reading early
+                raise RuntimeError(f"zcat exited with status {proc.returncode} reading {self.clinvar_path}")
+
+    def _load_cached_index(self) -> bool:
+        """Load the persisted index if it is at least as new as the VCF."""
+        try:
+            if os.path.getmtime(self.index_cache_path) < os.path.getmtime(self.clinvar_path):
+                logger.info("Cached ClinVar index is stale, rebuilding", path=self.index_cache_path)
+                return False
+            with open(self.index_cache_path, 'rb') as f:
+                self.clinvar_index = pickle.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception:
+            logger.exception("Error loading cached ClinVar index, rebuilding from VCF.")
+            self.clinvar_index = {}
+            return False
+
+        self._loaded = True
+        logger.info(f"Loaded {len(self.clinvar_index)} variants from cached ClinVar index.")
+        return True
+
+    def _save_cached_index(self) -> None:
+        """Persist the parsed index; best-effort since the data directory may be read-only."""
+        tmp_path = None
+        try:
+            # A unique temp file per writer, so concurrent workers never share a partial file;
+            # os.replace then swaps the finished index in atomically
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(self.index_cache_path) or ".",
+                                             suffix=".tmp", delete=False) as f:
+                tmp_path = f.name
+                pickle.dump(self.clinvar_index, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.index_cache_path)
+            logger.info("Saved ClinVar index cache", path=self.index_cache_path)
+        except Exception as e:
+            # Includes pickling errors: the cache is optional and must not fail the load
+            logger.warning(f"Could not save ClinVar index cache: {e}", path=self.index_cache_path)
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
 
     def _parse_clnsig(self, clnsig: str) -> str:
         """Parse ClinVar significance codes."""
@@ -69,19 +170,90 @@ class LocalClinVarService:
             return "Uncertain_significance"
         return "Not provided"
 
+    @staticmethod
+    def _info_value(info: bytes, tag: bytes) -> bytes:
+        """Extract a single INFO value without splitting the whole column."""
+        prefix = tag + b'='
+        if info.startswith(prefix):
+            start = len(prefix)
+        else:
+            start = info.find(b';' + prefix)
+            if start < 0:
+                return b''
+            start += len(prefix) + 1
+        end = info.find(b';', start)
+        return info[start:] if end < 0 else info[start:end]
+
+    @staticmethod
+    def _classify_clnsig_bytes(clnsig: bytes) -> str:
+        """Bytes counterpart of _parse_clnsig used while loading the index."""
+        sig_lower = clnsig.lower()
+        if b"pathogenic" in sig_lower:
+            return "Pathogenic/Likely_pathogenic"
+        if b"benign" in sig_lower:
+            return "Benign/Likely_benign"
+        if b"uncertain" in sig_lower:
+            return "Uncertain_significance"
+        return "Not provided"
+
     async def batch_annotate(self, variants: List[Variant]) -> Dict[str, VariantAnnotation]:
         """Annotate multiple variants using the local index."""
-        if not self.is_loaded():
+        if not await self.is_loaded():
             return {}
 
+        if self.tabix is not None:
+            return await asyncio.to_thread(self._annotate_from_tabix, variants)
+
         annotations = {}
+        index_get = self.clinvar_index.get
         for variant in variants:
-            key = f"{variant.chrom.replace('chr', '')}:{variant.pos}:{variant.ref}>{variant.alt[0]}"
-            if key in self.clinvar_index:
-                data = self.clinvar_index[key]
+            hit = index_get((variant.chrom.replace('chr', ''), variant.pos, variant.ref, variant.alt[0]))
+            if hit is not None:
+                clnsig, gene = hit
+                annotations[variant.variant_id] = VariantAnnotation(
+                    variant_id=variant.variant_id,
+                    source="ClinVar_Local",
+                    clinical_significance=clnsig,
+                    gene_symbol=gene
+                )
+        return annotations
+
+    def _annotate_from_tabix(self, variants: List[Variant]) -> Dict[str, VariantAnnotation]:
+        """Annotate variants by fetching each position from the tabix-indexed VCF."""
+        annotations = {}
+        for variant in variants:
+            records = self._fetch_position(variant.chrom.replace('chr', ''), variant.pos)
+            data = records.get((variant.ref, variant.alt[0]))
+            if data is not None:
                 annotations[variant.variant_id] = VariantAnnotation(
                     variant_id=variant.variant_id,
                     source="ClinVar_Local",
                     **data
                 )
         return annotations
+
+    def _fetch_position_uncached(self, chrom: str, pos: int) -> Dict[Tuple[str, str], Dict]:
+        """Return ClinVar records at a position, keyed by (ref, alt)."""
+        records = {}
+        try:
+            lines = self.tabix.fetch(chrom, pos - 1, pos)
+        except ValueError:
+            # Contig not present in the ClinVar index
+            return records
+
+        for line in lines:
+            _, pos_, _, ref, alts, _, _, info = line.split('\t', 8)[:8]
+            if int(pos_) != pos:
+                # Deletions spanning the position are returned too
+                continue
+
+            info_dict = {i.split('=', 1)[0]: i.split('=', 1)[1] for i in info.split(';') if '=' in i}
+            clnsig = self._parse_clnsig(info_dict.get('CLNSIG', ''))
+            gene = info_dict.get('GENEINFO', ':').split(':')[0]
+
+            for alt in alts.split(','):
+                records[(ref, alt)] = {
+                    'clinical_significance': clnsig,
+                    'gene_symbol': gene if gene else None
+                }
+        return records
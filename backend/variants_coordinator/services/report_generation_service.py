@@ -2,11 +2,13 @@
 Service to handle report generation (knowledge retrieval + clinical assessment) as a background task.
 """
 import asyncio
-import json
+import re
 import time
-import pickle
-from collections import Counter
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
 from typing import Dict, Any, List, Optional, Tuple
+import orjson
 import structlog
 from google.cloud import firestore_v1
 from google.genai.types import GenerateContentConfig
@@ -28,6 +30,153 @@ from ..core.acmg_genes import (
 
 logger = structlog.get_logger(__name__)
 
+# Precompiled patterns for pulling JSON out of LLM responses
+_JSON_FENCE = re.compile(r"```(?:json)?\s*([\s\S]*?)```", re.IGNORECASE)
+_TRAILING_COMMA_OBJ = re.compile(r',\s*}')
+_TRAILING_COMMA_ARR = re.compile(r',\s*]')
+# Braces plus whole string literals, so braces inside strings are skipped in one match
+_JSON_BRACE_TOKENS = re.compile(r'"(?:[^"\\]|\\.)*"|[{}]')
+
+# AlphaMissense score above which an unannotated variant is called likely pathogenic
+_AM_PATHOGENIC_THRESHOLD = 0.564
+
+# Bounds on the per-batch LLM prompts: genes with more variants than this are split
+# into several entries, and a batch closes at either limit below
+_MAX_VARIANTS_PER_GENE_ENTRY = 25
+_MAX_GENES_PER_BATCH = 10
+_MAX_VARIANTS_PER_BATCH = 100
+
+
+def _find_json_span(text: str) -> Optional[Tuple[int, int]]:
+    """Return the (start, end) slice of the first brace-balanced object in text."""
+    start = text.find('{')
+    if start == -1:
+        return None
+    depth = 0
+    for match in _JSON_BRACE_TOKENS.finditer(text, start):
+        token = match.group()
+        if token == '{':
+            depth += 1
+        elif token == '}':
+            depth -= 1
+            if depth == 0:
+                return start, match.end()
+    return None
+
+
+def _compact_json(value: Any) -> str:
+    """Serialize prompt data without whitespace to keep LLM input tokens down."""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+# Static parts of the final summary prompts, kept unindented since every
+# leading space is sent to the LLM as input tokens
+_CLINICAL_PROMPT_GUIDE = """You are a clinical geneticist reporting ACMG Secondary Findings (SF v3.3).
+These are medically actionable incidental findings from clinical sequencing.
+
+**EVIDENCE HIERARCHY (in order of confidence):**
+1. **ClinVar:** Expert-validated clinical assertions (Gold Standard)
+   - Pathogenic/Likely Pathogenic = confirmed clinical finding
+   - Always report the review status (e.g., "reviewed by expert panel")
+
+2. **AlphaMissense:** AI-predicted pathogenicity from Google DeepMind (Silver Standard)
+   - Score > 0.564: Likely Pathogenic
+   - Score < 0.34: Likely Benign
+   - Score 0.34-0.564: Ambiguous (treat as VUS)
+   - 90% precision validated against ClinVar
+   - NOT trained on ClinVar, so predictions are independent
+
+3. **ACMG Classifier:** Rule-based computational classification (Bronze Standard)
+   - Based on population frequency and variant type rules
+   - Use when neither ClinVar nor AlphaMissense provides clear signal
+
+**INTERPRETATION GUIDELINES:**
+- If ClinVar says Pathogenic → Report as CONFIRMED finding
+- If NO ClinVar but AlphaMissense score > 0.9 → Flag as "High-Priority Novel Candidate"
+- If AlphaMissense conflicts with ClinVar → Defer to ClinVar but NOTE the discordance
+- Always clearly state the evidence SOURCE when reporting pathogenicity
+- Include AlphaMissense score when discussing AI-predicted variants
+"""
+
+_CLINICAL_PROMPT_TASK = """**YOUR TASK:**
+Generate a clinical report that:
+1. Clearly distinguishes CONFIRMED (ClinVar) vs PREDICTED (AlphaMissense) findings
+2. Prioritizes immediate medical actions for confirmed pathogenic findings
+3. Flags high-confidence AlphaMissense predictions (score > 0.9) as research candidates
+4. Recommends cascade testing for family members
+5. Notes any discordance between ClinVar and AlphaMissense
+
+Return as JSON with three keys:
+- "clinical_summary": Brief summary with evidence sources noted for each major finding
+- "actionable_recommendations": Specific, prioritized clinical actions
+- "critical_key_findings": Most urgent findings with their evidence source and confidence"""
+
+_RESEARCH_PROMPT_GUIDE = """You are performing comprehensive genomic analysis for research purposes.
+
+**EVIDENCE SOURCES:**
+1. **ClinVar:** Expert-validated clinical assertions
+2. **AlphaMissense:** AI-predicted pathogenicity (Google DeepMind)
+   - Covers 89% of all 71 million possible human missense variants
+   - Score > 0.564 = likely pathogenic, < 0.34 = likely benign
+   - Enables analysis of novel variants not yet in clinical databases
+3. **ACMG Classifier:** Rule-based classification for remaining variants
+
+**RESEARCH VALUE OF ALPHAMISSENSE:**
+- Novel variants (not in ClinVar) with high AM scores = discovery opportunities
+- Discordance between ClinVar and AlphaMissense may indicate evolving understanding
+- AM scores enable prioritization for functional validation studies
+- Population-specific variants can be assessed even without clinical reports
+"""
+
+_RESEARCH_PROMPT_TASK = """**YOUR TASK:**
+Provide a comprehensive research assessment including:
+1. Novel high-confidence AlphaMissense predictions NOT in ClinVar (discovery candidates)
+2. Overall genetic burden and disease risk profile
+3. Gene pathway analysis and potential interactions
+4. ClinVar vs AlphaMissense concordance analysis
+5. Variants warranting functional validation studies
+
+Note: This is for RESEARCH purposes - be comprehensive but indicate this is not for clinical use.
+
+Return as JSON with three keys:
+- "clinical_summary": Comprehensive overview with evidence source breakdown
+- "actionable_recommendations": Research priorities and suggested investigations
+- "critical_key_findings": Most significant discoveries including novel AM predictions"""
+
+
+@lru_cache(maxsize=256)
+def _is_pathogenic(significance: str) -> bool:
+    """Whether a clinical significance string denotes (likely) pathogenic."""
+    # Significance values come from a small vocabulary, so cache the lowercase scan
+    return "pathogenic" in significance.lower()
+
+
+@dataclass(frozen=True)
+class _PromptStats:
+    """Gene and condition statistics shared by the clinical and research summary prompts."""
+    n_variants: int
+    gene_frequency: Counter
+    condition_frequency: Counter
+    genes_with_multiple_variants: Dict[str, int]
+    high_burden_genes: List[str]
+    top_conditions: List[Tuple[str, int]]
+
+    @classmethod
+    def from_variants(cls, pathogenic_variants: List[Dict[str, Any]]) -> "_PromptStats":
+        gene_frequency = Counter(gene for v in pathogenic_variants if (gene := v.get('gene')))
+        condition_frequency = Counter(
+            condition for v in pathogenic_variants if (condition := v.get('condition'))
+        )
+        return cls(
+            n_variants=len(pathogenic_variants),
+            gene_frequency=gene_frequency,
+            condition_frequency=condition_frequency,
+            genes_with_multiple_variants={gene: count for gene, count in gene_frequency.items() if count > 1},
+            high_burden_genes=[gene for gene, count in gene_frequency.items() if count > 2],
+            # Research mode shows the top 10, clinical mode the first 5 of these
+            top_conditions=condition_frequency.most_common(10),
+        )
+
 
 class ReportGenerationService:
     """Handles the complete report generation pipeline as a background task."""
@@ -60,6 +209,8 @@ class ReportGenerationService:
         """
         task_logger = logger.bind(task_id=task_id)
         task_ref = self.db.collection("background_tasks").document(task_id)
+        # Progress-only phase writes run in the background; awaited before the final write
+        phase_updates: List[asyncio.Task] = []
 
         try:
             # 1. Fetch task context from Firestore
@@ -111,21 +262,13 @@ class ReportGenerationService:
                     filename=vep_artifact
                 )
 
-                # Deserialize with periodic yielding
-                if hasattr(variants_artifact, 'inline_data') and variants_artifact.inline_data:
-                    data_bytes = variants_artifact.inline_data.data
-                    task_logger.info("Deserializing large variant dataset...")
-                    variants = pickle.loads(data_bytes)
-                    await asyncio.sleep(0.01)  # 10ms yield
-
-                    if isinstance(variants, list) and len(variants) > 100000:
-                        await asyncio.sleep(0.05)  # 50ms yield for very large datasets
-                else:
-                    variants = deserialize_data_from_artifact(variants_artifact)
-                    await asyncio.sleep(0.01)
+                # Deserialize on a worker thread, then drop the artifact so the
+                # serialized blob is freed instead of living alongside the variants
+                task_logger.info("Deserializing large variant dataset...")
+                variants = await asyncio.to_thread(deserialize_data_from_artifact, variants_artifact)
+                del variants_artifact
 
                 task_logger.info(f"Successfully loaded {len(variants)} variants from VEP artifact")
-                await asyncio.sleep(0.1)
 
             except Exception as e:
                 task_logger.error("Failed to load VEP artifact", error=str(e))
@@ -161,11 +304,11 @@ class ReportGenerationService:
 
             # 5. Knowledge Retrieval Phase
             task_logger.info("Starting knowledge retrieval phase")
-            await task_ref.update({
+            phase_updates.append(asyncio.create_task(task_ref.update({
                 "phase": "knowledge_retrieval",
                 "variants_being_analyzed": len(variants_to_annotate),
                 "updatedAt": firestore_v1.SERVER_TIMESTAMP
-            })
+            })))
 
             # Initialize clients
             clinvar = ClinVarClient()
@@ -173,98 +316,39 @@ class ReportGenerationService:
             acmg = ACMGClassifier()
 
             try:
-                # Get ClinVar annotations (only for filtered variants)
+                # Query ClinVar annotations and gnomAD population frequencies concurrently
+                # (only for filtered variants); the two lookups are independent
                 task_logger.info(
-                    f"Querying ClinVar for {len(variants_to_annotate)} variants "
+                    f"Querying ClinVar and gnomAD for {len(variants_to_annotate)} variants "
                     f"({analysis_mode} mode)"
                 )
-                annotations = await clinvar.batch_annotate(variants_to_annotate)
+                annotations, frequencies = await asyncio.gather(
+                    clinvar.batch_annotate(variants_to_annotate),
+                    gnomad.batch_query_frequencies(variants_to_annotate)
+                )
                 task_logger.info(f"Retrieved {len(annotations)} annotations from ClinVar")
-
-                await asyncio.sleep(0)
+                task_logger.info(f"Retrieved frequency data for {len(frequencies)} variants")
 
                 # Update gene symbols for annotated variants
                 gene_update_count = 0
-                CHUNK_SIZE = 1000
 
                 # Only update genes for the variants we're analyzing
-                for i in range(0, len(variants_to_annotate), CHUNK_SIZE):
-                    chunk_end = min(i + CHUNK_SIZE, len(variants_to_annotate))
-                    for j in range(i, chunk_end):
-                        v = variants_to_annotate[j]
-                        if v.variant_id in annotations and annotations[v.variant_id].gene_symbol:
-                            v.info["GENE"] = annotations[v.variant_id].gene_symbol
-                            gene_update_count += 1
-
-                    await asyncio.sleep(0)
-                    if i % 10000 == 0 and i > 0:
-                        await asyncio.sleep(0.01)
+                for v in variants_to_annotate:
+                    ann = annotations.get(v.variant_id)
+                    if ann is not None and ann.gene_symbol:
+                        v.info["GENE"] = ann.gene_symbol
+                        gene_update_count += 1
 
                 task_logger.info(f"Updated gene symbols for {gene_update_count} variants")
 
-                # Get gnomAD population frequencies (only for filtered variants)
-                task_logger.info(
-                    f"Querying gnomAD for population frequencies ({len(variants_to_annotate)} variants)"
-                )
-                frequencies = await gnomad.batch_query_frequencies(variants_to_annotate)
-                task_logger.info(f"Retrieved frequency data for {len(frequencies)} variants")
-
-                await asyncio.sleep(0)
-
                 # ACMG classification for unannotated variants
                 task_logger.info("Performing ACMG classification for unannotated variants...")
-                acmg_classified_count = 0
-                am_classified_count = 0  # Track AM classifications
-
-                CHUNK_SIZE = 1000
-                for i in range(0, len(variants_to_annotate), CHUNK_SIZE):
-                    chunk_end = min(i + CHUNK_SIZE, len(variants_to_annotate))
-                    for j in range(i, chunk_end):
-                        v = variants_to_annotate[j]
-
-                        # Get AlphaMissense data from variant info
-                        am_score = v.info.get('AM_score')
-                        am_class = v.info.get('AM_class')
-
-                        if v.variant_id not in annotations:
-                            freq = frequencies.get(v.variant_id)
-
-                            # Check AlphaMissense FIRST for unannotated variants
-                            if am_class == 'likely_pathogenic' or (am_score and am_score > 0.564):
-                                annotations[v.variant_id] = VariantAnnotation(
-                                    variant_id=v.variant_id,
-                                    source="AlphaMissense",
-                                    clinical_significance="Likely Pathogenic (AI Predicted)",
-                                    gene_symbol=v.info.get("GENE"),
-                                    am_pathogenicity=am_score,
-                                    am_class=am_class
-                                )
-                                am_classified_count += 1
-                            else:
-                                # Fall back to ACMG classifier
-                                classification, criteria, rationale = acmg.classify_variant(v, None, freq)
-
-                                if classification in ["Pathogenic", "Likely pathogenic"]:
-                                    annotations[v.variant_id] = VariantAnnotation(
-                                        variant_id=v.variant_id,
-                                        source="ACMG_Classifier",
-                                        clinical_significance=classification,
-                                        acmg_criteria=criteria,
-                                        gene_symbol=v.info.get("GENE"),
-                                        am_pathogenicity=am_score,
-                                        am_class=am_class
-                                    )
-                                    acmg_classified_count += 1
-                        else:
-                            # Add AM data to existing ClinVar annotations
-                            existing_ann = annotations[v.variant_id]
-                            if am_score is not None and existing_ann.am_pathogenicity is None:
-                                existing_ann.am_pathogenicity = am_score
-                                existing_ann.am_class = am_class
-
-                    await asyncio.sleep(0)
-                    if i % 10000 == 0 and i > 0:
-                        await asyncio.sleep(0.01)
+
+                # CPU-bound rule evaluation runs on a worker thread so the event loop stays free
+                new_annotations, am_classified_count, acmg_classified_count = await asyncio.to_thread(
+                    self._classify_unannotated, variants_to_annotate, annotations, frequencies, acmg
+                )
+                annotations.update(new_annotations)
 
                 task_logger.info(f"ACMG classified {acmg_classified_count} pathogenic variants")
                 task_logger.info(f"AlphaMissense classified {am_classified_count} pathogenic variants")
@@ -278,21 +362,21 @@ class ReportGenerationService:
                 task_logger.info("Applying ACMG reporting rules (filtering VUS, checking recessive genes)")
 
                 # Group annotations by gene
-                annotations_by_gene = {}
-                for variant_id, ann in annotations.items():
-                    if ann.gene_symbol:
-                        if ann.gene_symbol not in annotations_by_gene:
-                            annotations_by_gene[ann.gene_symbol] = []
-                        annotations_by_gene[ann.gene_symbol].append(ann)
+                annotations_by_gene = defaultdict(list)
+                for ann in annotations.values():
+                    gene = ann.gene_symbol
+                    if gene:
+                        annotations_by_gene[gene].append(ann)
 
                 # Apply ACMG-specific reporting rules
                 filtered_annotations_by_gene = apply_acmg_reporting_rules(annotations_by_gene)
 
                 # Rebuild annotations dict with only reportable variants
-                filtered_annotations = {}
-                for gene, anns in filtered_annotations_by_gene.items():
-                    for ann in anns:
-                        filtered_annotations[ann.variant_id] = ann
+                filtered_annotations = {
+                    ann.variant_id: ann
+                    for anns in filtered_annotations_by_gene.values()
+                    for ann in anns
+                }
 
                 task_logger.info(
                     f"After ACMG filtering: {len(filtered_annotations)} reportable variants "
@@ -302,50 +386,57 @@ class ReportGenerationService:
                 # Use filtered annotations for clinical mode
                 annotations = filtered_annotations
 
+            # Only counts are needed from here on; release the variant objects so they
+            # don't sit in memory while the annotations artifact is pickled
+            total_variants = len(variants)
+            total_variants_analyzed = len(variants_to_annotate)
+            del variants, variants_to_annotate
+
             # Save annotations artifact
             annotations_data = {
                 'annotations': annotations,
                 'frequencies': frequencies,
                 'analysis_mode': analysis_mode,
-                'total_variants_analyzed': len(variants_to_annotate)
+                'total_variants_analyzed': total_variants_analyzed
             }
             annotations_artifact_name = f"annotations_{task_id}.pkl"
 
             task_logger.info("Saving annotations artifact", artifact_name=annotations_artifact_name)
+            annotations_part = await asyncio.to_thread(serialize_data_to_artifact, annotations_data)
             await self.artifact_service.save_artifact(
                 app_name=app_name,
                 user_id=user_id,
                 session_id=session_id,
                 filename=annotations_artifact_name,
-                artifact=serialize_data_to_artifact(annotations_data)
+                artifact=annotations_part
             )
             task_logger.info(
                 f"Saved annotations artifact with {len(annotations)} annotations "
                 f"(mode: {analysis_mode})"
             )
 
-            await asyncio.sleep(0)
-
             # 7. Clinical Assessment Phase
             task_logger.info("Starting clinical assessment phase")
-            await task_ref.update({
+            phase_updates.append(asyncio.create_task(task_ref.update({
                 "phase": "clinical_assessment",
                 "updatedAt": firestore_v1.SERVER_TIMESTAMP
-            })
+            })))
 
             # Extract pathogenic variants for assessment
             pathogenic_variants = []
-            for variant_id, ann in annotations.items():
-                if ann.clinical_significance and "pathogenic" in ann.clinical_significance.lower():
+            for ann in annotations.values():
+                significance = ann.clinical_significance
+                if significance and _is_pathogenic(significance):
                     condition_text = ann.condition
                     if isinstance(condition_text, list):
                         condition_text = "; ".join(condition_text) if condition_text else None
 
-                    category_obj = get_gene_category(ann.gene_symbol) if ann.gene_symbol else None
+                    gene = ann.gene_symbol
+                    category_obj = get_gene_category(gene) if gene else None
                     pathogenic_variants.append({
                         "variant_id": ann.variant_id,
-                        "gene": ann.gene_symbol,
-                        "significance": ann.clinical_significance,
+                        "gene": gene,
+                        "significance": significance,
                         "condition": condition_text,
                         "category": category_obj.value if category_obj else "Other",
                         "source": ann.source or "ClinVar",
@@ -380,8 +471,8 @@ class ReportGenerationService:
                 "analysis_mode": analysis_mode,
                 "pathogenic_count": len(pathogenic_variants),
                 "total_annotations": len(annotations),
-                "total_variants": len(variants),
-                "total_variants_analyzed": len(variants_to_annotate),
+                "total_variants": total_variants,
+                "total_variants_analyzed": total_variants_analyzed,
                 "clinical_summary": clinical_summary,
                 "recommendations": recommendations,
                 "key_findings": key_findings,
@@ -390,20 +481,23 @@ class ReportGenerationService:
 
             if analysis_mode == "clinical":
                 report_data["acmg_version"] = "SF v3.3"
-                report_data["acmg_genes_analyzed"] = len(set(ann.gene_symbol for ann in annotations.values() if ann.gene_symbol))
+                report_data["acmg_genes_analyzed"] = len({gene for ann in annotations.values() if (gene := ann.gene_symbol)})
 
-            # 9. Update task as completed
-            await task_ref.update({
+            # Let in-flight phase writes land so they can't overwrite the final state
+            await asyncio.gather(*phase_updates)
+
+            # 9-10. Mark task completed and update session metadata in one commit
+            batch = self.db.batch()
+            batch.update(task_ref, {
                 "status": "completed",
                 "phase": "complete",
                 "updatedAt": firestore_v1.SERVER_TIMESTAMP,
                 "output": report_data
             })
-
-            # 10. Update session metadata
             metadata_service = SessionMetadataService(self.db)
-            await metadata_service.update_metadata(
-                session_id=session_id,
+            await metadata_service.commit_updates(
+                session_id,
+                batch=batch,
                 status="completed",
                 report_status="completed",
                 analysis_mode=analysis_mode,
@@ -417,12 +511,13 @@ class ReportGenerationService:
                 analysis_mode=analysis_mode,
                 pathogenic_count=len(pathogenic_variants),
                 total_annotations=len(annotations),
-                variants_analyzed=len(variants_to_annotate)
+                variants_analyzed=total_variants_analyzed
             )
 
         except Exception as e:
             task_logger.exception("Report generation failed", error=str(e))
 
+            await asyncio.gather(*phase_updates, return_exceptions=True)
             await task_ref.update({
                 "status": "failed",
                 "error": str(e),
@@ -441,6 +536,69 @@ class ReportGenerationService:
                 except:
                     pass
 
+    @staticmethod
+    def _classify_unannotated(
+            variants: List,
+            annotations: Dict[str, VariantAnnotation],
+            frequencies: Dict[str, Dict],
+            acmg: ACMGClassifier
+    ) -> Tuple[Dict[str, VariantAnnotation], int, int]:
+        """
+        Classify variants lacking a ClinVar annotation via AlphaMissense, then ACMG rules.
+        Existing annotations are enriched with AlphaMissense data in place.
+
+        Returns:
+            Tuple of (new annotations by variant_id, AM classified count, ACMG classified count)
+        """
+        am_classified_count = 0
+        acmg_classified_count = 0
+
+        # Single flat pass; the AlphaMissense check runs before the costlier
+        # ACMG rule evaluation so most variants never reach the classifier.
+        # New annotations are collected separately and merged in bulk by the caller.
+        new_annotations = {}
+        for v in variants:
+            # Get AlphaMissense data from variant info
+            info = v.info
+            am_score = info.get('AM_score')
+            am_class = info.get('AM_class')
+
+            existing_ann = annotations.get(v.variant_id)
+            if existing_ann is None:
+                # Check AlphaMissense FIRST for unannotated variants
+                if am_class == 'likely_pathogenic' or (am_score and am_score > _AM_PATHOGENIC_THRESHOLD):
+                    new_annotations[v.variant_id] = VariantAnnotation(
+                        variant_id=v.variant_id,
+                        source="AlphaMissense",
+                        clinical_significance="Likely Pathogenic (AI Predicted)",
+                        gene_symbol=info.get("GENE"),
+                        am_pathogenicity=am_score,
+                        am_class=am_class
+                    )
+                    am_classified_count += 1
+                else:
+                    # Fall back to ACMG classifier
+                    freq = frequencies.get(v.variant_id)
+                    classification, criteria, rationale = acmg.classify_variant(v, None, freq)
+
+                    if classification in ["Pathogenic", "Likely pathogenic"]:
+                        new_annotations[v.variant_id] = VariantAnnotation(
+                            variant_id=v.variant_id,
+                            source="ACMG_Classifier",
+                            clinical_significance=classification,
+                            acmg_criteria=criteria,
+                            gene_symbol=info.get("GENE"),
+                            am_pathogenicity=am_score,
+                            am_class=am_class
+                        )
+                        acmg_classified_count += 1
+            elif am_score is not None and existing_ann.am_pathogenicity is None:
+                # Add AM data to existing ClinVar annotations
+                existing_ann.am_pathogenicity = am_score
+                existing_ann.am_class = am_class
+
+        return new_annotations, am_classified_count, acmg_classified_count
+
     async def _generate_clinical_assessment(
             self,
             pathogenic_variants: List[Dict[str, Any]],
@@ -457,22 +615,13 @@ class ReportGenerationService:
             task_logger.warning("Gemini client not available, using fallback assessment")
             return self._generate_fallback_assessment(pathogenic_variants, analysis_mode)
 
-        # Calculate statistics for pattern detection
-        gene_list = [v.get('gene') for v in pathogenic_variants if v.get('gene')]
-        gene_frequency = Counter(gene_list)
-        genes_with_multiple_variants = {gene: count for gene, count in gene_frequency.items() if count > 1}
+        # Calculate statistics for pattern detection once for the final summary prompt
+        stats = _PromptStats.from_variants(pathogenic_variants)
 
-        condition_list = [v.get('condition') for v in pathogenic_variants if v.get('condition')]
-        condition_frequency = Counter(condition_list)
-
-        # Group variants by gene
-        variants_by_gene = {}
+        # Group variants by gene (variants without a gene symbol are grouped under None)
+        variants_by_gene = defaultdict(list)
         for v in pathogenic_variants:
-            gene = v.get('gene')
-            if gene:
-                if gene not in variants_by_gene:
-                    variants_by_gene[gene] = []
-                variants_by_gene[gene].append(v)
+            variants_by_gene[v.get('gene')].append(v)
 
         # Process in batches for better performance
         async def process_batch(batch, batch_num, total_batches):
@@ -484,8 +633,8 @@ class ReportGenerationService:
 
             prompt = f"""{context}
 
-            **Pathogenic Variants in batch {batch_num} of {total_batches}:**
-            {json.dumps(batch, indent=2)}
+            **Pathogenic variants grouped by gene, batch {batch_num} of {total_batches}:**
+            {_compact_json(batch)}
 
             Provide your response as a JSON object with these keys: 
             - "clinical_findings": List of important clinical findings from this batch
@@ -494,65 +643,78 @@ class ReportGenerationService:
             - "actionable_items": List of actionable recommendations from this batch
             - "variant_interactions": Any notable interactions or patterns within this batch"""
 
-            try:
-                response = await clients.genai_client.aio.models.generate_content(
-                    model='gemini-2.5-flash',
-                    contents=prompt,
-                    config=GenerateContentConfig(
-                        response_mime_type="application/json",
-                        max_output_tokens=65535,
-                        temperature=0.1
+            # Retry transient API failures with exponential backoff before dropping the batch
+            max_attempts = 3
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    response = await clients.genai_client.aio.models.generate_content(
+                        model='gemini-2.5-flash',
+                        contents=prompt,
+                        config=GenerateContentConfig(
+                            response_mime_type="application/json",
+                            max_output_tokens=65535,
+                            temperature=0.1
+                        )
                     )
-                )
-
-                if response.text:
-                    return self._extract_json_from_response(response.text)
-                else:
-                    task_logger.warning(f"Empty response for batch {batch_num}")
-                    return None
 
-            except Exception as e:
-                task_logger.error(f"Error processing batch {batch_num}: {e}")
-                return None
+                    if response.text:
+                        return self._extract_json_from_response(response.text)
+                    else:
+                        task_logger.warning(f"Empty response for batch {batch_num}")
+                        return None
+
+                except Exception as e:
+                    if attempt == max_attempts:
+                        task_logger.error(f"Error processing batch {batch_num}: {e}")
+                        return None
+                    task_logger.warning(
+                        f"Batch {batch_num} failed, retrying",
+                        attempt=attempt,
+                        error=str(e)
+                    )
+                    await asyncio.sleep(2 ** attempt)
 
-        # Batch the variants
-        batch_size = 50
-        batches = [pathogenic_variants[i:i + batch_size]
-                   for i in range(0, len(pathogenic_variants), batch_size)]
+        batches = self._build_prompt_batches(variants_by_gene)
 
-        task_logger.info(f"Processing {len(batches)} batches of variants...")
+        task_logger.info(
+            f"Processing {len(batches)} batches covering {len(variants_by_gene)} gene groups..."
+        )
 
         # Process batches concurrently with a limit
-        max_concurrent = 5
+        max_concurrent = 16
         semaphore = asyncio.Semaphore(max_concurrent)
 
         async def process_with_semaphore(batch, batch_num, total_batches):
             async with semaphore:
                 result = await process_batch(batch, batch_num, total_batches)
-                await asyncio.sleep(0)
-                return result
+                return batch_num, result
 
         tasks = [process_with_semaphore(batch, i + 1, len(batches))
                  for i, batch in enumerate(batches)]
 
-        batch_results = await asyncio.gather(*tasks)
+        # Collect results as batches complete, then merge in batch order so the
+        # findings sliced into the summary prompt don't depend on completion order
+        results_by_batch = {}
+        for completed in asyncio.as_completed(tasks):
+            batch_num, result = await completed
+            if result:
+                results_by_batch[batch_num] = result
 
-        # Merge results
         all_findings = []
         all_genes = set()
         all_conditions = set()
         all_actionable = []
         all_interactions = []
+        successful_batches = len(results_by_batch)
 
-        for result in batch_results:
-            if result:
-                all_findings.extend(result.get("clinical_findings", []))
-                all_genes.update(result.get("genes_in_batch", []))
-                all_conditions.update(result.get("conditions_in_batch", []))
-                all_actionable.extend(result.get("actionable_items", []))
-                all_interactions.extend(result.get("variant_interactions", []))
+        for batch_num in sorted(results_by_batch):
+            result = results_by_batch[batch_num]
+            all_findings.extend(result.get("clinical_findings", []))
+            all_genes.update(result.get("genes_in_batch", []))
+            all_conditions.update(result.get("conditions_in_batch", []))
+            all_actionable.extend(result.get("actionable_items", []))
+            all_interactions.extend(result.get("variant_interactions", []))
 
-        successful_batches = len([r for r in batch_results if r])
         task_logger.info(f"Processed {successful_batches}/{len(batches)} batches successfully")
 
         if successful_batches == 0:
@@ -562,15 +724,11 @@ class ReportGenerationService:
         # Generate final summary with mode-specific prompts
         if analysis_mode == "clinical":
             summary_prompt = self._get_clinical_mode_prompt(
-                pathogenic_variants, gene_frequency, condition_frequency,
-                genes_with_multiple_variants, all_findings, all_genes,
-                all_interactions, all_actionable
+                stats, all_findings, all_genes, all_interactions, all_actionable
             )
         else:
             summary_prompt = self._get_research_mode_prompt(
-                pathogenic_variants, gene_frequency, condition_frequency,
-                genes_with_multiple_variants, all_findings, all_genes,
-                all_interactions, all_actionable
+                stats, all_findings, all_genes, all_interactions, all_actionable
             )
 
         try:
@@ -598,124 +756,119 @@ class ReportGenerationService:
 
         return self._generate_fallback_assessment(pathogenic_variants, analysis_mode)
 
-    def _get_clinical_mode_prompt(self, pathogenic_variants, gene_frequency, condition_frequency,
-                                  genes_with_multiple_variants, all_findings, all_genes,
+    @classmethod
+    def _build_prompt_batches(cls, variants_by_gene: Dict[Optional[str], List[Dict[str, Any]]]
+                              ) -> List[List[Dict[str, Any]]]:
+        """
+        Pack per-gene summaries into bounded LLM batches.
+
+        Send one summary per gene instead of repeating gene/category/condition for
+        every variant. Genes over _MAX_VARIANTS_PER_GENE_ENTRY are split into several
+        entries, and a batch closes once it holds _MAX_GENES_PER_BATCH entries or
+        _MAX_VARIANTS_PER_BATCH variants, so no single prompt grows with gene size.
+        """
+        batches = []
+        current_batch = []
+        current_count = 0
+        for gene, gene_variants in variants_by_gene.items():
+            for start in range(0, len(gene_variants), _MAX_VARIANTS_PER_GENE_ENTRY):
+                chunk = gene_variants[start:start + _MAX_VARIANTS_PER_GENE_ENTRY]
+                current_batch.append(cls._summarize_gene_group(gene, chunk, len(gene_variants)))
+                current_count += len(chunk)
+                if len(current_batch) >= _MAX_GENES_PER_BATCH or current_count >= _MAX_VARIANTS_PER_BATCH:
+                    batches.append(current_batch)
+                    current_batch = []
+                    current_count = 0
+        if current_batch:
+            batches.append(current_batch)
+        return batches
+
+    @staticmethod
+    def _summarize_gene_group(gene: Optional[str], gene_variants: List[Dict[str, Any]],
+                              total_variants: int) -> Dict[str, Any]:
+        """Collapse a gene's pathogenic variants into one compact prompt entry."""
+        conditions = list(dict.fromkeys(v['condition'] for v in gene_variants if v.get('condition')))
+        return {
+            "gene": gene or "Unknown",
+            "category": gene_variants[0].get("category"),
+            "n_variants": total_variants,
+            "variants": [
+                {
+                    "variant_id": v["variant_id"],
+                    "significance": v["significance"],
+                    "source": v["source"],
+                    "am_pathogenicity": v.get("am_pathogenicity"),
+                    "am_class": v.get("am_class"),
+                }
+                for v in gene_variants
+            ],
+            "conditions": conditions
+        }
+
+    def _get_clinical_mode_prompt(self, stats: _PromptStats, all_findings, all_genes,
                                   all_interactions, all_actionable):
         """Generate prompt for clinical mode (ACMG secondary findings)."""
-        return f"""You are a clinical geneticist reporting ACMG Secondary Findings (SF v3.3).
-    These are medically actionable incidental findings from clinical sequencing.
-    
-    **EVIDENCE HIERARCHY (in order of confidence):**
-    1. **ClinVar:** Expert-validated clinical assertions (Gold Standard)
-       - Pathogenic/Likely Pathogenic = confirmed clinical finding
-       - Always report the review status (e.g., "reviewed by expert panel")
-    
-    2. **AlphaMissense:** AI-predicted pathogenicity from Google DeepMind (Silver Standard)
-       - Score > 0.564: Likely Pathogenic
-       - Score < 0.34: Likely Benign  
-       - Score 0.34-0.564: Ambiguous (treat as VUS)
-       - 90% precision validated against ClinVar
-       - NOT trained on ClinVar, so predictions are independent
-    
-    3. **ACMG Classifier:** Rule-based computational classification (Bronze Standard)
-       - Based on population frequency and variant type rules
-       - Use when neither ClinVar nor AlphaMissense provides clear signal
-    
-    **INTERPRETATION GUIDELINES:**
-    - If ClinVar says Pathogenic → Report as CONFIRMED finding
-    - If NO ClinVar but AlphaMissense score > 0.9 → Flag as "High-Priority Novel Candidate"
-    - If AlphaMissense conflicts with ClinVar → Defer to ClinVar but NOTE the discordance
-    - Always clearly state the evidence SOURCE when reporting pathogenicity
-    - Include AlphaMissense score when discussing AI-predicted variants
-    
-    **ACMG SECONDARY FINDINGS ANALYSIS:**
-    - Total pathogenic/likely pathogenic variants in ACMG genes: {len(pathogenic_variants)}
-    - Unique ACMG genes with findings: {len(gene_frequency)}
-    - Genes with multiple variants (possible compound heterozygosity): {json.dumps(genes_with_multiple_variants, indent=2)}
-    
-    **KEY PATTERNS:**
-    - Most common conditions: {json.dumps(condition_frequency.most_common(5), indent=2)}
-    - Genes requiring immediate action: {json.dumps([gene for gene, count in gene_frequency.items() if count > 1], indent=2)}
-    
-    **BATCH ANALYSIS RESULTS:**
-    - Clinical findings: {len(all_findings)} total findings
-    - Sample findings: {json.dumps(all_findings[:10], indent=2)}
-    - Actionable items identified: {json.dumps(all_actionable[:10], indent=2)}
-    
-    **YOUR TASK:**
-    Generate a clinical report that:
-    1. Clearly distinguishes CONFIRMED (ClinVar) vs PREDICTED (AlphaMissense) findings
-    2. Prioritizes immediate medical actions for confirmed pathogenic findings
-    3. Flags high-confidence AlphaMissense predictions (score > 0.9) as research candidates
-    4. Recommends cascade testing for family members
-    5. Notes any discordance between ClinVar and AlphaMissense
-    
-    Return as JSON with three keys:
-    - "clinical_summary": Brief summary with evidence sources noted for each major finding
-    - "actionable_recommendations": Specific, prioritized clinical actions
-    - "critical_key_findings": Most urgent findings with their evidence source and confidence"""
-
-    def _get_research_mode_prompt(self, pathogenic_variants, gene_frequency, condition_frequency,
-                                  genes_with_multiple_variants, all_findings, all_genes,
+        dumps = _compact_json
+        return "\n".join((
+            _CLINICAL_PROMPT_GUIDE,
+            "**ACMG SECONDARY FINDINGS ANALYSIS:**",
+            f"- Total pathogenic/likely pathogenic variants in ACMG genes: {stats.n_variants}",
+            f"- Unique ACMG genes with findings: {len(stats.gene_frequency)}",
+            f"- Genes with multiple variants (possible compound heterozygosity): {dumps(stats.genes_with_multiple_variants)}",
+            "",
+            "**KEY PATTERNS:**",
+            f"- Most common conditions: {', '.join(f'{condition}: {count}' for condition, count in stats.top_conditions[:5])}",
+            f"- Genes requiring immediate action: {dumps(list(stats.genes_with_multiple_variants))}",
+            "",
+            "**BATCH ANALYSIS RESULTS:**",
+            f"- Clinical findings: {len(all_findings)} total findings",
+            f"- Sample findings: {dumps(all_findings[:10])}",
+            f"- Actionable items identified: {dumps(all_actionable[:10])}",
+            "",
+            _CLINICAL_PROMPT_TASK,
+        ))
+
+    def _get_research_mode_prompt(self, stats: _PromptStats, all_findings, all_genes,
                                   all_interactions, all_actionable):
         """Generate prompt for research mode (comprehensive analysis)."""
-        return f"""You are performing comprehensive genomic analysis for research purposes.
-    
-    **EVIDENCE SOURCES:**
-    1. **ClinVar:** Expert-validated clinical assertions
-    2. **AlphaMissense:** AI-predicted pathogenicity (Google DeepMind)
-       - Covers 89% of all 71 million possible human missense variants
-       - Score > 0.564 = likely pathogenic, < 0.34 = likely benign
-       - Enables analysis of novel variants not yet in clinical databases
-    3. **ACMG Classifier:** Rule-based classification for remaining variants
-    
-    **RESEARCH VALUE OF ALPHAMISSENSE:**
-    - Novel variants (not in ClinVar) with high AM scores = discovery opportunities
-    - Discordance between ClinVar and AlphaMissense may indicate evolving understanding
-    - AM scores enable prioritization for functional validation studies
-    - Population-specific variants can be assessed even without clinical reports
-    
-    **COMPREHENSIVE GENOME ANALYSIS:**
-    - Total pathogenic/likely pathogenic variants: {len(pathogenic_variants)}
-    - Total unique genes affected: {len(gene_frequency)}
-    - Total unique conditions: {len(condition_frequency)}
-    
-    **CRITICAL PATTERN ANALYSIS:**
-    - Genes with multiple pathogenic variants: {json.dumps(genes_with_multiple_variants, indent=2)}
-    - Most frequent conditions (top 10): {json.dumps(condition_frequency.most_common(10), indent=2)}
-    - High-burden genes (>2 variants): {json.dumps([gene for gene, count in gene_frequency.items() if count > 2], indent=2)}
-    
-    **BATCH ANALYSIS SYNTHESIS:**
-    - Total findings: {len(all_findings)}
-    - Unique genes: {len(all_genes)}
-    - Variant interactions: {json.dumps(all_interactions[:10], indent=2)}
-    - Research insights: {json.dumps(all_actionable[:20], indent=2)}
-    
-    **YOUR TASK:**
-    Provide a comprehensive research assessment including:
-    1. Novel high-confidence AlphaMissense predictions NOT in ClinVar (discovery candidates)
-    2. Overall genetic burden and disease risk profile
-    3. Gene pathway analysis and potential interactions
-    4. ClinVar vs AlphaMissense concordance analysis
-    5. Variants warranting functional validation studies
-    
-    Note: This is for RESEARCH purposes - be comprehensive but indicate this is not for clinical use.
-    
-    Return as JSON with three keys:
-    - "clinical_summary": Comprehensive overview with evidence source breakdown
-    - "actionable_recommendations": Research priorities and suggested investigations  
-    - "critical_key_findings": Most significant discoveries including novel AM predictions"""
+        dumps = _compact_json
+        return "\n".join((
+            _RESEARCH_PROMPT_GUIDE,
+            "**COMPREHENSIVE GENOME ANALYSIS:**",
+            f"- Total pathogenic/likely pathogenic variants: {stats.n_variants}",
+            f"- Total unique genes affected: {len(stats.gene_frequency)}",
+            f"- Total unique conditions: {len(stats.condition_frequency)}",
+            "",
+            "**CRITICAL PATTERN ANALYSIS:**",
+            f"- Genes with multiple pathogenic variants: {dumps(stats.genes_with_multiple_variants)}",
+            f"- Most frequent conditions (top 10): {', '.join(f'{condition}: {count}' for condition, count in stats.top_conditions)}",
+            f"- High-burden genes (>2 variants): {dumps(stats.high_burden_genes)}",
+            "",
+            "**BATCH ANALYSIS SYNTHESIS:**",
+            f"- Total findings: {len(all_findings)}",
+            f"- Unique genes: {len(all_genes)}",
+            f"- Variant interactions: {dumps(all_interactions[:10])}",
+            f"- Research insights: {dumps(all_actionable[:20])}",
+            "",
+            _RESEARCH_PROMPT_TASK,
+        ))
 
     def _generate_fallback_assessment(self, pathogenic_variants: List[Dict[str, Any]],
                                       analysis_mode: str) -> Tuple[str, List[str], List[str]]:
         """Generate a basic assessment without LLM."""
-        gene_list = [v.get('gene') for v in pathogenic_variants if v.get('gene')]
-        gene_frequency = Counter(gene_list)
+        n_variants = len(pathogenic_variants)
+        # One pass for both the gene tally and the distinct categories
+        gene_frequency = Counter()
+        categories = set()
+        for v in pathogenic_variants:
+            if gene := v.get('gene'):
+                gene_frequency[gene] += 1
+            categories.add(v.get('category', 'Other'))
         genes_with_multiple = {gene: count for gene, count in gene_frequency.items() if count > 1}
 
         if analysis_mode == "clinical":
             summary = (
-                f"ACMG Secondary Findings Analysis: Identified {len(pathogenic_variants)} "
+                f"ACMG Secondary Findings Analysis: Identified {n_variants} "
                 f"pathogenic/likely pathogenic variants in {len(gene_frequency)} ACMG-reportable genes. "
             )
 
@@ -733,14 +886,14 @@ class ReportGenerationService:
             ]
 
             key_findings = [
-                f"Total ACMG secondary findings: {len(pathogenic_variants)} variants",
+                f"Total ACMG secondary findings: {n_variants} variants",
                 f"Genes requiring action: {', '.join(list(gene_frequency.keys())[:10])}",
                 "Medical follow-up required per ACMG SF v3.3 guidelines"
             ]
         else:
             # Research mode
             summary = (
-                f"Comprehensive Genomic Analysis: Identified {len(pathogenic_variants)} "
+                f"Comprehensive Genomic Analysis: Identified {n_variants} "
                 f"pathogenic/likely pathogenic variants across {len(gene_frequency)} genes. "
             )
 
@@ -759,8 +912,8 @@ class ReportGenerationService:
 
             key_findings = [
                 f"{len(genes_with_multiple)} genes have multiple pathogenic variants",
-                f"Total genetic burden: {len(pathogenic_variants)} pathogenic variants",
-                f"Affected genes span {len(set(v.get('category', 'Other') for v in pathogenic_variants))} categories"
+                f"Total genetic burden: {n_variants} pathogenic variants",
+                f"Affected genes span {len(categories)} categories"
             ]
 
         return summary, recommendations, key_findings
@@ -775,39 +928,42 @@ class ReportGenerationService:
             cleaned = response_text.strip()
             if cleaned.startswith('\ufeff'):
                 cleaned = cleaned[1:]
-            return json.loads(cleaned)
-        except json.JSONDecodeError:
+            return orjson.loads(cleaned)
+        except orjson.JSONDecodeError:
             pass
 
-        # Try extracting from code blocks
-        import re
-        json_patterns = [
-            r"```(?:json|JSON)?\s*\n?([\s\S]*?)```",
-            r"```(?:json|JSON)?\s*([\s\S]*?)```",
-        ]
-
-        for pattern in json_patterns:
-            matches = re.findall(pattern, response_text, re.DOTALL | re.IGNORECASE)
-            if matches:
-                for match in matches:
-                    try:
-                        match_cleaned = match.strip()
-                        if match_cleaned.startswith('{') and match_cleaned.endswith('}'):
-                            return json.loads(match_cleaned)
-                    except json.JSONDecodeError:
-                        continue
-
-        # Try finding JSON boundaries
+        # Try extracting from code blocks, stopping at the first one that parses
+        for match in _JSON_FENCE.finditer(response_text):
+            candidate = match.group(1).strip()
+            if candidate.startswith('{') and candidate.endswith('}'):
+                try:
+                    return orjson.loads(candidate)
+                except orjson.JSONDecodeError:
+                    continue
+
+        # Try finding JSON boundaries: the first balanced object, then the
+        # widest first-'{' to last-'}' slice in case the balanced one is prose
+        spans = []
+        balanced = _find_json_span(response_text)
+        if balanced:
+            spans.append(balanced)
         json_start = response_text.find('{')
         json_end = response_text.rfind('}')
+        if json_start != -1 and json_end > json_start and (json_start, json_end + 1) != balanced:
+            spans.append((json_start, json_end + 1))
 
-        if json_start != -1 and json_end != -1 and json_end > json_start:
+        for start, end in spans:
+            potential_json = response_text[start:end]
             try:
-                potential_json = response_text[json_start:json_end + 1]
-                fixed_json = re.sub(r',\s*}', '}', potential_json)
-                fixed_json = re.sub(r',\s*]', ']', fixed_json)
-                return json.loads(fixed_json)
-            except json.JSONDecodeError:
+                return orjson.loads(potential_json)
+            except orjson.JSONDecodeError:
                 pass
+            # Only pay for the trailing-comma fixups when the raw span doesn't parse
+            try:
+                fixed_json = _TRAILING_COMMA_OBJ.sub('}', potential_json)
+                fixed_json = _TRAILING_COMMA_ARR.sub(']', fixed_json)
+                return orjson.loads(fixed_json)
+            except orjson.JSONDecodeError:
+                continue
 
         return None
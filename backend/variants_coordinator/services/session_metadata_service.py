@@ -1,12 +1,30 @@
 """Session metadata management service using Firestore."""
 
+import asyncio
 import structlog
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from google.cloud import firestore
 
 logger = structlog.get_logger(__name__)
 
+# Fields shown in session listings
+_SESSION_LISTING_FIELDS = (
+    "session_id",
+    "title",
+    "created_at",
+    "updated_at",
+    "status",
+    "analysis_mode",
+    "vcf_path",
+    "variant_count",
+    "pathogenic_count",
+    "vep_status",
+    "report_status",
+    "summary",
+    "tags",
+)
+
 
 class SessionMetadataService:
     """
@@ -18,6 +36,10 @@ class SessionMetadataService:
         self.db = db_client
         self.collection = "user_sessions"
 
+    def _doc_ref(self, session_id: str):
+        """Document reference for a session's metadata."""
+        return self.db.collection(self.collection).document(session_id)
+
     async def create_metadata(
             self,
             session_id: str,
@@ -27,7 +49,7 @@ class SessionMetadataService:
             analysis_mode: str = "clinical"
     ) -> Dict[str, Any]:
         """Create metadata record for a new session."""
-        doc_ref = self.db.collection(self.collection).document(session_id)
+        doc_ref = self._doc_ref(session_id)
 
         metadata = {
             "session_id": session_id,
@@ -61,7 +83,7 @@ class SessionMetadataService:
             **updates
     ) -> None:
         """Update specific fields in session metadata."""
-        doc_ref = self.db.collection(self.collection).document(session_id)
+        doc_ref = self._doc_ref(session_id)
         updates["updated_at"] = firestore.SERVER_TIMESTAMP
 
         # Log if analysis mode is being updated
@@ -75,9 +97,38 @@ class SessionMetadataService:
         await doc_ref.update(updates)
         logger.debug("Updated session metadata", session_id=session_id, fields=list(updates.keys()))
 
+    def stage_update(
+            self,
+            batch,
+            session_id: str,
+            **updates
+    ) -> None:
+        """Stage a metadata update on a Firestore WriteBatch; the caller commits it."""
+        doc_ref = self._doc_ref(session_id)
+        updates["updated_at"] = firestore.SERVER_TIMESTAMP
+        batch.update(doc_ref, updates)
+        logger.debug("Staged session metadata update", session_id=session_id, fields=list(updates.keys()))
+
+    async def commit_updates(
+            self,
+            session_id: str,
+            batch=None,
+            **updates
+    ) -> None:
+        """
+        Apply all metadata updates for a session in a single commit.
+
+        Pass a WriteBatch that already holds other writes (e.g. the background
+        task document) to land them together in one round trip.
+        """
+        if batch is None:
+            batch = self.db.batch()
+        self.stage_update(batch, session_id, **updates)
+        await batch.commit()
+
     async def get_metadata(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Get metadata for a specific session."""
-        doc_ref = self.db.collection(self.collection).document(session_id)
+        doc_ref = self._doc_ref(session_id)
         doc = await doc_ref.get()
 
         if doc.exists:
@@ -93,49 +144,54 @@ class SessionMetadataService:
             self,
             firebase_uid: str,
             limit: int = 20,
-            offset: int = 0
-    ) -> List[Dict[str, Any]]:
-        """List sessions for a user, ordered by creation date."""
-        query = (
+            offset: int = 0,
+            cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        List sessions for a user, ordered by creation date.
+
+        Pass the returned next cursor (the last session_id of the page) back as
+        `cursor` to fetch the following page; Firestore still reads and bills
+        for documents skipped by `offset`, so offset is only kept for older clients.
+        Returns the page of sessions and the next cursor, or None on the last page.
+        """
+        query = self._user_sessions_query(firebase_uid)
+        if cursor:
+            last_doc = await self._doc_ref(cursor).get()
+            if not last_doc.exists or last_doc.get("firebase_uid") != firebase_uid:
+                raise ValueError(f"Invalid session cursor: {cursor}")
+            query = query.start_after(last_doc)
+        elif offset:
+            query = query.offset(offset)
+
+        docs = [doc async for doc in query.limit(limit).stream()]
+        next_cursor = docs[-1].id if len(docs) == limit else None
+        return [self._session_summary(doc.to_dict()) for doc in docs], next_cursor
+
+    def _user_sessions_query(self, firebase_uid: str):
+        """Base query for a user's sessions, newest first, projected to the listing fields."""
+        return (
             self.db.collection(self.collection)
             .where("firebase_uid", "==", firebase_uid)
             .order_by("created_at", direction=firestore.Query.DESCENDING)
-            .limit(limit)
-            .offset(offset)
+            # Only the listing fields cross the wire
+            .select(_SESSION_LISTING_FIELDS)
         )
 
-        docs = query.stream()
-        sessions = []
-        async for doc in docs:
-            session_data = doc.to_dict()
-
-            # Ensure analysis_mode is present for backwards compatibility
-            if "analysis_mode" not in session_data:
-                session_data["analysis_mode"] = "clinical"
-
-            # Include key fields in listing for better UI display
-            session_summary = {
-                "session_id": session_data.get("session_id"),
-                "title": session_data.get("title"),
-                "created_at": session_data.get("created_at"),
-                "updated_at": session_data.get("updated_at"),
-                "status": session_data.get("status"),
-                "analysis_mode": session_data.get("analysis_mode", "clinical"),
-                "vcf_path": session_data.get("vcf_path"),
-                "variant_count": session_data.get("variant_count"),
-                "pathogenic_count": session_data.get("pathogenic_count"),
-                "vep_status": session_data.get("vep_status"),
-                "report_status": session_data.get("report_status"),
-                "summary": session_data.get("summary"),
-                "tags": session_data.get("tags", [])
-            }
-            sessions.append(session_summary)
-
-        return sessions
+    @staticmethod
+    def _session_summary(session_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Pick the key fields shown in session listings."""
+        summary = {field: session_data.get(field) for field in _SESSION_LISTING_FIELDS}
+        # Defaults for documents created before these fields existed
+        if summary["analysis_mode"] is None:
+            summary["analysis_mode"] = "clinical"
+        if summary["tags"] is None:
+            summary["tags"] = []
+        return summary
 
     async def delete_metadata(self, session_id: str) -> None:
         """Delete session metadata."""
-        doc_ref = self.db.collection(self.collection).document(session_id)
+        doc_ref = self._doc_ref(session_id)
         await doc_ref.delete()
         logger.info("Deleted session metadata", session_id=session_id)
 
@@ -181,8 +237,7 @@ class SessionMetadataService:
         if "total_variants_analyzed" in mode_stats:
             updates["total_variants_analyzed"] = mode_stats["total_variants_analyzed"]
 
-        doc_ref = self.db.collection(self.collection).document(session_id)
-        await doc_ref.update(updates)
+        await self._doc_ref(session_id).update(updates)
 
         logger.info(
             "Updated session with analysis statistics",
@@ -197,39 +252,35 @@ class SessionMetadataService:
         """Get summary statistics for all user sessions."""
         query = self.db.collection(self.collection).where("firebase_uid", "==", firebase_uid)
 
-        docs = query.stream()
+        # Server-side aggregations: one small RPC per metric group instead of
+        # streaming every session document back to sum it here
+        totals, research, completed, failed = await asyncio.gather(
+            self._aggregate(
+                query.count(alias="total_sessions")
+                .sum("variant_count", alias="total_variants_analyzed")
+                .sum("pathogenic_count", alias="total_pathogenic_found")
+            ),
+            # != skips documents without an analysis_mode, which predate research mode
+            self._aggregate(query.where("analysis_mode", "!=", "clinical").count(alias="count")),
+            self._aggregate(query.where("status", "==", "completed").count(alias="count")),
+            self._aggregate(query.where("status", "==", "error").count(alias="count")),
+        )
 
-        stats = {
-            "total_sessions": 0,
-            "clinical_sessions": 0,
-            "research_sessions": 0,
-            "completed_sessions": 0,
-            "failed_sessions": 0,
-            "total_variants_analyzed": 0,
-            "total_pathogenic_found": 0
+        total_sessions = totals.get("total_sessions", 0)
+        research_sessions = research.get("count", 0)
+        return {
+            "total_sessions": total_sessions,
+            # Sessions without an analysis_mode count as clinical
+            "clinical_sessions": total_sessions - research_sessions,
+            "research_sessions": research_sessions,
+            "completed_sessions": completed.get("count", 0),
+            "failed_sessions": failed.get("count", 0),
+            "total_variants_analyzed": int(totals.get("total_variants_analyzed") or 0),
+            "total_pathogenic_found": int(totals.get("total_pathogenic_found") or 0)
         }
 
-        async for doc in docs:
-            data = doc.to_dict()
-            stats["total_sessions"] += 1
-
-            # Count by mode
-            mode = data.get("analysis_mode", "clinical")
-            if mode == "clinical":
-                stats["clinical_sessions"] += 1
-            else:
-                stats["research_sessions"] += 1
-
-            # Count by status
-            if data.get("status") == "completed":
-                stats["completed_sessions"] += 1
-            elif data.get("status") == "error":
-                stats["failed_sessions"] += 1
-
-            # Accumulate variant counts
-            if data.get("variant_count"):
-                stats["total_variants_analyzed"] += data["variant_count"]
-            if data.get("pathogenic_count"):
-                stats["total_pathogenic_found"] += data["pathogenic_count"]
-
-        return stats
+    @staticmethod
+    async def _aggregate(aggregation_query) -> Dict[str, Any]:
+        """Run an aggregation query and return its results keyed by alias."""
+        results = await aggregation_query.get()
+        return {result.alias: result.value for row in results for result in row}
@@ -1,18 +1,33 @@
 """VCF file parsing service."""
 
-from typing import List, Dict, Any, Optional, Generator
+from collections import Counter
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Generator, Iterable, Tuple
 import structlog
-from ..models.variant import Variant
+from ..models.variant import LazyInfo, Variant
 
 logger = structlog.get_logger(__name__)
 
 
+@lru_cache(maxsize=64)
+def _format_indexes(format_field: str) -> Tuple[int, int]:
+    """Positions of GT and GQ in a FORMAT string, or -1 if absent."""
+    # A file typically has only a handful of distinct FORMAT strings
+    keys = format_field.split(":")
+    gt_index = keys.index("GT") if "GT" in keys else -1
+    gq_index = keys.index("GQ") if "GQ" in keys else -1
+    return gt_index, gq_index
+
+
 class VCFParser:
     """Parse VCF files and extract variant information."""
 
     def __init__(self):
         self.header_lines = []
         self.sample_names = []
+        # Chromosome names and FILTER tokens repeat on nearly every line;
+        # sharing one string object per distinct value saves heap per variant
+        self._interned: Dict[str, str] = {}
 
     def parse_header(self, lines: List[str]) -> None:
         """Parse VCF header lines to find sample names."""
@@ -27,74 +42,95 @@ class VCFParser:
 
     def parse_variant_line(self, line: str) -> Optional[Variant]:
         """Parse a single variant line from VCF."""
-        if line.startswith("#") or not line.strip():
+        line = line.strip()
+        if not line or line[0] == "#":
             return None
 
-        fields = line.strip().split("\t")
+        # Only the first sample column is used, so stop splitting after it
+        fields = line.split("\t", 10)
         if len(fields) < 8:
             return None
 
+        intern = self._interned.setdefault
         try:
-            info = {}
-            if fields[7] != ".":
-                for item in fields[7].split(";"):
-                    if "=" in item:
-                        key, value = item.split("=", 1)
-                        info[key] = value
-                    else:
-                        info[item] = True
-
             genotype, genotype_quality = None, None
             if len(fields) > 9:
-                format_keys = fields[8].split(":")
+                gt_index, gq_index = _format_indexes(fields[8])
                 format_values = fields[9].split(":")
-                format_dict = dict(zip(format_keys, format_values))
-                genotype = format_dict.get("GT")
-                gq_val = format_dict.get("GQ")
-                if gq_val and gq_val != ".":
-                    genotype_quality = float(gq_val)
-
-            return Variant(
-                chrom=fields[0],
+                n_values = len(format_values)
+                # Trailing sample fields may be dropped, so guard each index
+                if 0 <= gt_index < n_values:
+                    genotype = format_values[gt_index]
+                if 0 <= gq_index < n_values:
+                    gq_val = format_values[gq_index]
+                    if gq_val and gq_val != ".":
+                        genotype_quality = float(gq_val)
+
+            variant = Variant(
+                chrom=intern(fields[0], fields[0]),
                 pos=int(fields[1]),
                 ref=fields[3],
                 alt=fields[4].split(",") if fields[4] != "." else [],
                 qual=float(fields[5]) if fields[5] != "." else None,
-                filter=fields[6].split(";") if fields[6] != "." else ["PASS"],
-                info=info,
+                filter=[intern(f, f) for f in fields[6].split(";")] if fields[6] != "." else ["PASS"],
                 genotype=genotype,
-                genotype_quality=genotype_quality
+                genotype_quality=genotype_quality,
+                # Kept as a LazyInfo by validation; parsed only if something reads it
+                info=LazyInfo(fields[7])
             )
+            return variant
         except (ValueError, IndexError) as e:
             logger.error(f"Error parsing variant line", line=line, error=str(e))
             return None
 
     def parse_vcf_content(self, content: str) -> Generator[Variant, None, None]:
         """Parse VCF content and yield variants."""
-        lines = content.strip().split("\n")
-        header_lines = [line for line in lines if line.startswith("#")]
-        self.parse_header(header_lines)
+        # splitlines() keeps the compact str representation, whereas StringIO
+        # copies the whole content into a 4-byte-per-character buffer
+        yield from self.parse_vcf_stream(content.splitlines())
 
-        for line in lines:
-            if not line.startswith("#"):
-                variant = self.parse_variant_line(line)
-                if variant:
-                    yield variant
+    def parse_vcf_stream(self, line_iter: Iterable[str]) -> Generator[Variant, None, None]:
+        """Parse VCF lines from any iterable in a single pass and yield variants."""
+        header_buf = []
+        for line in line_iter:
+            if header_buf is not None:
+                if line.startswith("#"):
+                    header_buf.append(line.rstrip("\r\n"))
+                    continue
+                self.parse_header(header_buf)
+                header_buf = None
+
+            variant = self.parse_variant_line(line)
+            if variant:
+                yield variant
+
+        # Header-only file
+        if header_buf:
+            self.parse_header(header_buf)
 
     def get_summary_stats(self, variants: List[Variant]) -> Dict[str, Any]:
         """Get summary statistics for a list of variants."""
+        variant_types = Counter()
+        chromosomes = Counter()
+        no_quality = high_quality = medium_quality = low_quality = passed = 0
+
+        # One pass over the variants; Counter handles the per-key tallies
+        for variant in variants:
+            variant_types[variant.variant_type] += 1
+            chromosomes[variant.chrom] += 1
+            qual = variant.qual
+            if qual is None: no_quality += 1
+            elif qual > 30: high_quality += 1
+            elif qual >= 10: medium_quality += 1
+            else: low_quality += 1
+            if "PASS" in variant.filter: passed += 1
+
         stats = {
-            "total_variants": len(variants), "variant_types": {}, "chromosomes": {},
-            "quality_distribution": {"high_quality": 0, "medium_quality": 0, "low_quality": 0, "no_quality": 0},
-            "filter_status": {"PASS": 0, "filtered": 0}
+            "total_variants": len(variants), "variant_types": dict(variant_types), "chromosomes": dict(chromosomes),
+            "quality_distribution": {
+                "high_quality": high_quality, "medium_quality": medium_quality,
+                "low_quality": low_quality, "no_quality": no_quality
+            },
+            "filter_status": {"PASS": passed, "filtered": len(variants) - passed}
         }
-        for variant in variants:
-            stats["variant_types"][variant.variant_type] = stats["variant_types"].get(variant.variant_type, 0) + 1
-            stats["chromosomes"][variant.chrom] = stats["chromosomes"].get(variant.chrom, 0) + 1
-            if variant.qual is None: stats["quality_distribution"]["no_quality"] += 1
-            elif variant.qual > 30: stats["quality_distribution"]["high_quality"] += 1
-            elif variant.qual >= 10: stats["quality_distribution"]["medium_quality"] += 1
-            else: stats["quality_distribution"]["low_quality"] += 1
-            if "PASS" in variant.filter: stats["filter_status"]["PASS"] += 1
-            else: stats["filter_status"]["filtered"] += 1
         return stats
@@ -4,8 +4,13 @@ It is designed to be called by a background worker (e.g., triggered by Cloud Tas
 """
 
 import asyncio
+import multiprocessing
 import os
-import json
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import orjson
+from typing import List, Tuple
 import structlog
 from google.cloud import firestore_v1
 
@@ -15,6 +20,74 @@ from ..services.session_metadata_service import SessionMetadataService
 
 logger = structlog.get_logger(__name__)
 
+# VEP emits one JSON record per line, and records with many transcript
+# consequences can exceed asyncio's default 64 KiB line limit
+_VEP_LINE_LIMIT = 16 * 1024 * 1024
+
+# Minimal VCF header for the sites-only batches piped to VEP
+_VEP_VCF_HEADER = b"##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+
+# Raw keys checked before decoding a VEP record
+_TRANSCRIPT_CONSEQUENCES_KEY = b'"transcript_consequences"'
+_INPUT_KEY = b'"input":"'
+# Tab as escaped inside the JSON-encoded input field
+_JSON_TAB = b'\\t'
+
+# Number of VEP output lines handed to the parse pool at a time
+_PARSE_CHUNK_LINES = 2000
+
+
+def _parse_vep_records(lines: List[bytes]) -> Tuple[list, list]:
+    """
+    Decode VEP JSON lines into compact annotation records.
+
+    Runs in the parse pool, so it only takes and returns plain picklable values:
+    one (gene, consequences, impact, am_score, am_class) tuple per line, or None
+    where the line failed to decode, plus (line prefix, error) pairs for those.
+    """
+    records = []
+    errors = []
+    for line in lines:
+        try:
+            data = orjson.loads(line)
+
+            gene = None
+            consequences = set()
+            impact = None
+            # AlphaMissense variables
+            am_score = None
+            am_class = None
+
+            # Extract annotations from transcript consequences
+            for tc in data.get('transcript_consequences', []):
+                if tc.get('gene_symbol'):
+                    gene = tc.get('gene_symbol')
+                if tc.get('consequence_terms'):
+                    consequences.update(tc['consequence_terms'])
+                if tc.get('impact'):
+                    impact = tc.get('impact')
+
+                # Extract AlphaMissense data from nested structure
+                # VEP outputs lowercase key: {"alphamissense": {"am_pathogenicity": ..., "am_class": ...}}
+                am_data = tc.get('alphamissense', {})
+                if am_score is None and am_data.get('am_pathogenicity') is not None:
+                    am_score = float(am_data['am_pathogenicity'])
+                if am_class is None and am_data.get('am_class'):
+                    am_class = am_data['am_class']
+
+                # Fallback: flat fields directly on the transcript consequence
+                if am_score is None and tc.get('am_pathogenicity') is not None:
+                    am_score = float(tc['am_pathogenicity'])
+                if am_class is None and tc.get('am_class'):
+                    am_class = tc['am_class']
+
+            records.append((gene, tuple(consequences), impact, am_score, am_class))
+        except ValueError as e:
+            # orjson.JSONDecodeError
+            records.append(None)
+            errors.append((line[:100], str(e)))
+    return records, errors
+
 
 class VepRunnerService:
     """Encapsulates the logic to execute a VEP annotation task."""
@@ -33,6 +106,162 @@ class VepRunnerService:
         self.db = db_client
         self.artifact_service = artifact_service
 
+    @staticmethod
+    async def _feed_stdin(process, data: bytes) -> None:
+        """Write the batch VCF to VEP's stdin, then close it to signal EOF."""
+        try:
+            process.stdin.write(data)
+            await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # VEP exited early; its return code and stderr report why
+            pass
+        finally:
+            process.stdin.close()
+
+    async def _annotate_batch(self, cmd, vcf_lines, variant_map, parse_pool, task_logger,
+                              batch_num: int, total_batches: int) -> Tuple[int, int]:
+        """Run VEP on one batch and apply its annotations; returns (annotations, AM scores) added."""
+        task_logger.info("Processing VEP batch",
+                         batch_num=batch_num,
+                         total_batches=total_batches,
+                         batch_size=len(vcf_lines))
+
+        # VCF rows are precomputed per variant, so a batch is a single join
+        vcf_content = _VEP_VCF_HEADER + b"".join(vcf_lines)
+
+        # VEP's stderr is only read if it fails, so it goes to an anonymous temp file
+        # rather than a pipe the event loop would have to keep draining
+        stderr_file = tempfile.TemporaryFile()
+
+        # Execute VEP
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=stderr_file,
+                limit=_VEP_LINE_LIMIT
+            )
+        except BaseException:
+            stderr_file.close()
+            raise
+
+        # Feed stdin in the background while stdout is parsed
+        # line by line as VEP emits it, instead of buffering it all
+        stdin_task = asyncio.create_task(self._feed_stdin(process, vcf_content))
+
+        # Decode VEP JSON in the parse pool, in chunks of lines, so the event loop
+        # only reads stdout and applies the compact per-variant results
+        loop = asyncio.get_running_loop()
+        pending = []
+        chunk = []
+        chunk_variants = []
+        try:
+            async for line in process.stdout:
+                # Records without transcript consequences (e.g. intergenic) add no
+                # annotations, so skip decoding them at all
+                if _TRANSCRIPT_CONSEQUENCES_KEY not in line or line.startswith(b'#'):
+                    continue
+
+                # Resolve the variant from the echoed input line (CHROM\tPOS\t...) in the
+                # raw bytes, so lines that don't match a variant are never decoded
+                start = line.find(_INPUT_KEY)
+                if start < 0:
+                    continue
+                start += len(_INPUT_KEY)
+                tab1 = line.find(_JSON_TAB, start)
+                tab2 = line.find(_JSON_TAB, tab1 + 2)
+                if tab1 < 0 or tab2 < 0:
+                    continue
+                try:
+                    variant = variant_map.get((line[start:tab1], int(line[tab1 + 2:tab2])))
+                except ValueError as e:
+                    task_logger.warning("Failed to parse VEP input position", line=line[:100], error=str(e))
+                    continue
+                if variant is None:
+                    continue
+
+                chunk.append(line)
+                chunk_variants.append(variant)
+                if len(chunk) >= _PARSE_CHUNK_LINES:
+                    pending.append((chunk_variants, loop.run_in_executor(parse_pool, _parse_vep_records, chunk)))
+                    chunk = []
+                    chunk_variants = []
+            if chunk:
+                pending.append((chunk_variants, loop.run_in_executor(parse_pool, _parse_vep_records, chunk)))
+
+            intern = sys.intern
+            annotations_in_batch = 0
+            am_scores_in_batch = 0
+            for variants, future in pending:
+                records, errors = await future
+                for bad_line, error in errors:
+                    task_logger.warning("Failed to parse VEP JSON line", line=bad_line, error=error)
+
+                for variant, record in zip(variants, records):
+                    if record is None:
+                        continue
+                    gene, consequences, impact, am_score, am_class = record
+
+                    # Collect the VEP annotations and apply them to the variant in one update
+                    annotations = {}
+                    if gene:
+                        annotations['GENE'] = gene
+                        annotations_in_batch += 1
+                    if consequences:
+                        # Terms come from a small SO vocabulary; interning lets every variant
+                        # (and the pickled artifact) share one string per term
+                        annotations['VEP_consequence'] = [intern(term) for term in consequences]
+                    if impact:
+                        annotations['VEP_impact'] = impact
+
+                    # Store AlphaMissense data in variant info
+                    if am_score is not None:
+                        annotations['AM_score'] = am_score
+                        am_scores_in_batch += 1
+                    if am_class:
+                        annotations['AM_class'] = am_class
+                    if annotations:
+                        variant.info.update(annotations)
+        except BaseException:
+            # Don't leave VEP running (or its pipes open) if parsing is aborted
+            stdin_task.cancel()
+            for _, future in pending:
+                future.cancel()
+            if process.returncode is None:
+                process.kill()
+            stderr_file.close()
+            raise
+
+        await stdin_task
+        with stderr_file:
+            if await process.wait() != 0:
+                stderr_file.seek(0)
+                # A stray non-UTF-8 byte must not mask the VEP failure itself
+                error_msg = stderr_file.read().decode(errors="replace")
+                task_logger.error("VEP process failed", error=error_msg)
+                raise AgentExecutionError(f"VEP process failed: {error_msg}")
+
+        task_logger.info("Completed VEP batch",
+                         batch_num=batch_num,
+                         total_batches=total_batches,
+                         annotations_added=annotations_in_batch,
+                         am_scores_found=am_scores_in_batch)
+        return annotations_in_batch, am_scores_in_batch
+
+    @staticmethod
+    async def _update_progress(task_ref, task_logger, **progress) -> None:
+        """Write batch progress to the task document; failures are logged, not raised."""
+        try:
+            await task_ref.update({
+                "progress": progress,
+                "updatedAt": firestore_v1.SERVER_TIMESTAMP
+            })
+        except Exception as progress_err:
+            task_logger.warning("Failed to update Firestore progress",
+                                error=str(progress_err),
+                                batch_num=progress.get("current_batch"))
+
     async def run(self, task_id: str):
         """The main execution method for a VEP task."""
         task_logger = logger.bind(task_id=task_id)
@@ -40,8 +269,13 @@ class VepRunnerService:
         # Use the instance-level client
         task_ref = self.db.collection("background_tasks").document(task_id)
 
-        # Determine fork count
-        fork_count = int(os.environ.get('VEP_FORK_COUNT', '4'))
+        # VEP processes run concurrently on separate batches
+        vep_concurrency = max(1, int(os.environ.get('VEP_CONCURRENCY', '2')))
+        # Each batch is a separate VEP startup (cache and plugin load), so batches are
+        # large; 250k sites-only rows is only ~10 MB of input per VEP process, and
+        # output is streamed, so batch size barely affects memory
+        batch_size = max(1, int(os.environ.get('VEP_BATCH_SIZE', '250000')))
+        verify_save = os.environ.get('VEP_VERIFY_SAVE') == '1'
 
         try:
             # 1. Fetch the full task context from Firestore
@@ -86,18 +320,14 @@ class VepRunnerService:
                     app_name=app_name, user_id=user_id, session_id=session_id, filename=input_artifact
                 )
 
-                # Log artifact details
-                if variants_artifact:
-                    task_logger.info("Artifact loaded successfully",
-                                     artifact_type=type(variants_artifact).__name__,
-                                     has_inline_data=hasattr(variants_artifact, 'inline_data'),
-                                     inline_data_size=len(variants_artifact.inline_data.data) if hasattr(
-                                         variants_artifact, 'inline_data') and variants_artifact.inline_data else 0)
-                else:
+                if not variants_artifact:
                     task_logger.error("Artifact loaded but is None")
 
-                variants = deserialize_data_from_artifact(variants_artifact)
-                task_logger.info(f"Deserialized {len(variants)} variants from artifact")
+                # Unpickling millions of variants is CPU-bound; keep it off the event loop
+                variants = await asyncio.to_thread(deserialize_data_from_artifact, variants_artifact)
+                # The raw pickle bytes aren't needed for the hours-long annotation run
+                del variants_artifact
+                task_logger.info("Deserialized variants from artifact", variant_count=len(variants))
 
             except Exception as e:
                 task_logger.error("Failed to load input artifact",
@@ -106,175 +336,115 @@ class VepRunnerService:
                 raise
 
             # 4. Execute the VEP annotation logic using the installed VEP
-            batch_size = 5000
             total_variants = len(variants)
-            variant_map = {f"{v.chrom.replace('chr', '')}:{v.pos}": v for v in variants}
-
-            task_logger.info(
-                f"Starting VEP annotation for {total_variants} variants in {-(-total_variants // batch_size)} batches")
+            total_batches = (total_variants + batch_size - 1) // batch_size
+            # VEP_FORK_COUNT is the total fork budget, split between the VEP processes
+            # that actually run at once so the node is neither oversubscribed nor left
+            # idle when there are fewer batches than VEP_CONCURRENCY
+            fork_count = max(1, int(os.environ.get('VEP_FORK_COUNT', '4'))
+                             // max(1, min(vep_concurrency, total_batches)))
+            # Keyed by (chrom without 'chr' prefix, pos) as echoed back in VEP's input field;
+            # chrom is bytes so output lines can be matched before JSON decoding
+            variant_map = {}
+            # Sites-only VCF row per variant, built once rather than on every batch
+            vcf_lines = []
+            for v in variants:
+                chrom = v.chrom.replace('chr', '')
+                variant_map[(chrom.encode(), v.pos)] = v
+                vcf_lines.append(f"{chrom}\t{v.pos}\t.\t{v.ref}\t{','.join(v.alt)}\t.\tPASS\t.\n".encode())
+
+            task_logger.info("Starting VEP annotation",
+                             total_variants=total_variants,
+                             total_batches=total_batches)
+
+            # Use the VEP installed directly in the container
+            cmd = [
+                '/opt/ensembl-vep/vep',
+                '--cache',
+                '--offline',
+                '--dir_cache', '/mnt/cache',  # Using the mounted persistent disk
+                '--dir_plugins', '/opt/ensembl-vep/Plugins',
+                '--assembly', 'GRCh38',
+                '--format', 'vcf',
+                '--json',
+                '--symbol',
+                '--no_stats',
+                '--fork', str(fork_count),
+                '--plugin', 'AlphaMissense,file=/app/data/AlphaMissense_hg38.tsv.gz',
+                '-o', 'STDOUT'
+            ]
 
             total_annotations = 0
             total_am_scores = 0
 
-            for i in range(0, total_variants, batch_size):
-                batch_end = min(i + batch_size, total_variants)
-                batch = variants[i:batch_end]
-                batch_num = i // batch_size + 1
-                total_batches = -(-total_variants // batch_size)  # Ceiling division
-                task_logger.info(f"Processing VEP batch {batch_num}/{total_batches}",
-                                 batch_size=len(batch),
-                                 batch_start_idx=i,
-                                 batch_end_idx=batch_end)
-
-                # Create VCF content for this batch
-                vcf_content = "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
-                for variant in batch:
-                    chrom = variant.chrom.replace('chr', '')
-                    vcf_content += f"{chrom}\t{variant.pos}\t.\t{variant.ref}\t{','.join(variant.alt)}\t.\tPASS\t.\n"
-
-                # Use the VEP installed directly in the container
-                cmd = [
-                    '/opt/ensembl-vep/vep',
-                    '--cache',
-                    '--offline',
-                    '--dir_cache', '/mnt/cache',  # Using the mounted persistent disk
-                    '--dir_plugins', '/opt/ensembl-vep/Plugins',
-                    '--assembly', 'GRCh38',
-                    '--format', 'vcf',
-                    '--json',
-                    '--symbol',
-                    '--no_stats',
-                    '--fork', str(fork_count),
-                    '--plugin', 'AlphaMissense,file=/app/data/AlphaMissense_hg38.tsv.gz',
-                    '-o', 'STDOUT'
-                ]
-
-                # Execute VEP
-                process = await asyncio.create_subprocess_exec(
-                    *cmd,
-                    stdin=asyncio.subprocess.PIPE,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-
-                stdout, stderr = await process.communicate(input=vcf_content.encode())
-
-                if process.returncode != 0:
-                    error_msg = stderr.decode()
-                    task_logger.error("VEP process failed", error=error_msg)
-                    raise AgentExecutionError(f"VEP process failed: {error_msg}")
-
-                # Parse VEP JSON output
-                annotations_in_batch = 0
-                am_scores_in_batch = 0
-                for line in stdout.decode().split('\n'):
-                    if not line.strip() or line.startswith('#'):
-                        continue
+            # Keep several VEP processes running on disjoint batches, so VEP and JSON
+            # decoding overlap and one process's fork-join tail doesn't idle the node
+            semaphore = asyncio.Semaphore(vep_concurrency)
 
-                    try:
-                        data = json.loads(line)
+            async def run_batch(i):
+                async with semaphore:
+                    return await self._annotate_batch(
+                        cmd, vcf_lines[i:i + batch_size], variant_map, parse_pool, task_logger,
+                        batch_num=i // batch_size + 1, total_batches=total_batches
+                    )
 
-                        # Extract location from input field
-                        loc_parts = data.get('input', '').split('\t')[:2]
-                        if len(loc_parts) < 2:
+            # JSON decoding is CPU-bound and would otherwise stall the event loop (and with
+            # it stdout reads and progress writes); spawn avoids forking gRPC client state
+            parse_pool = ProcessPoolExecutor(max_workers=vep_concurrency,
+                                             mp_context=multiprocessing.get_context("spawn"))
+            batch_tasks = [asyncio.create_task(run_batch(i)) for i in range(0, total_variants, batch_size)]
+            progress_update = None
+            try:
+                for completed_batches, completed in enumerate(asyncio.as_completed(batch_tasks), start=1):
+                    annotations_in_batch, am_scores_in_batch = await completed
+                    total_annotations += annotations_in_batch
+                    total_am_scores += am_scores_in_batch
+
+                    # Update Firestore progress after each batch, in the background so the
+                    # RPC doesn't stall output parsing. While a write is still in flight the
+                    # update is skipped, so an older write can never land after a newer one.
+                    is_last = completed_batches == total_batches
+                    if progress_update is not None and not progress_update.done():
+                        if not is_last:
                             continue
-
-                        key = f"{loc_parts[0]}:{loc_parts[1]}"
-                        if key in variant_map:
-                            variant = variant_map[key]
-                            gene = None
-                            consequences = []
-                            impact = None
-                            # AlphaMissense variables
-                            am_score = None
-                            am_class = None
-
-                            # Extract annotations from transcript consequences
-                            for tc in data.get('transcript_consequences', []):
-                                if tc.get('gene_symbol'):
-                                    gene = tc.get('gene_symbol')
-                                if tc.get('consequence_terms'):
-                                    consequences.extend(tc['consequence_terms'])
-                                if tc.get('impact'):
-                                    impact = tc.get('impact')
-
-                                # Extract AlphaMissense data from nested structure
-                                # VEP outputs lowercase key: {"alphamissense": {"am_pathogenicity": ..., "am_class": ...}}
-                                am_data = tc.get('alphamissense', {})
-                                if am_score is None and am_data.get('am_pathogenicity') is not None:
-                                    am_score = float(am_data['am_pathogenicity'])
-                                if am_class is None and am_data.get('am_class'):
-                                    am_class = am_data['am_class']
-
-                                # Fallback: flat fields directly on the transcript consequence
-                                if am_score is None and tc.get('am_pathogenicity') is not None:
-                                    am_score = float(tc['am_pathogenicity'])
-                                if am_class is None and tc.get('am_class'):
-                                    am_class = tc['am_class']
-
-                            # Update variant with VEP annotations
-                            if gene:
-                                variant.info['GENE'] = gene
-                                annotations_in_batch += 1
-                            if consequences:
-                                variant.info['VEP_consequence'] = list(set(consequences))
-                            if impact:
-                                variant.info['VEP_impact'] = impact
-
-                            # Store AlphaMissense data in variant info
-                            if am_score is not None:
-                                variant.info['AM_score'] = am_score
-                                am_scores_in_batch += 1
-                            if am_class:
-                                variant.info['AM_class'] = am_class
-
-                    except json.JSONDecodeError as e:
-                        task_logger.warning("Failed to parse VEP JSON line", line=line[:100], error=str(e))
-                        continue
-
-                task_logger.info(f"Completed VEP batch {batch_num}/{total_batches}",
-                                 annotations_added=annotations_in_batch,
-                                 am_scores_found=am_scores_in_batch)
-
-                total_annotations += annotations_in_batch
-                total_am_scores += am_scores_in_batch
-
-                # Update Firestore progress every 25 batches
-                if batch_num % 25 == 0 or batch_num == total_batches:
-                    progress_pct = round(batch_num / total_batches * 100, 1)
-                    try:
-                        await task_ref.update({
-                            "progress": {
-                                "current_batch": batch_num,
-                                "total_batches": total_batches,
-                                "progress_pct": progress_pct,
-                                "annotations_added": total_annotations,
-                                "am_scores_found": total_am_scores,
-                            },
-                            "updatedAt": firestore_v1.SERVER_TIMESTAMP
-                        })
-                    except Exception as progress_err:
-                        task_logger.warning("Failed to update Firestore progress",
-                                           error=str(progress_err),
-                                           batch_num=batch_num)
+                        await progress_update
+                    progress_update = asyncio.create_task(self._update_progress(
+                        task_ref, task_logger,
+                        current_batch=completed_batches,
+                        total_batches=total_batches,
+                        progress_pct=round(completed_batches / total_batches * 100, 1),
+                        annotations_added=total_annotations,
+                        am_scores_found=total_am_scores
+                    ))
+            finally:
+                # A failed batch aborts the task; don't leave the others running
+                for task in batch_tasks:
+                    task.cancel()
+                await asyncio.gather(*batch_tasks, return_exceptions=True)
+                parse_pool.shutdown(wait=False, cancel_futures=True)
+
+            # Flush the final progress write before the task is marked completed
+            if progress_update is not None:
+                await progress_update
 
             task_logger.info("VEP annotation complete for all batches.")
 
+            # Only the variants themselves are saved; release the lookup structures
+            # before the artifact (serialized bytes plus upload buffer) is built
+            variant_map.clear()
+            vcf_lines.clear()
+
             # 5. Save the annotated variants to the output artifact
             task_logger.info("Preparing to save annotated variants",
                              output_artifact=output_artifact,
                              variant_count=len(variants))
 
             try:
-                # Serialize the data
-                final_artifact = serialize_data_to_artifact(variants)
-
-                # Log serialized artifact details
-                task_logger.info("Artifact serialized",
-                                 artifact_type=type(final_artifact).__name__,
-                                 has_inline_data=hasattr(final_artifact, 'inline_data'),
-                                 inline_data_size=len(final_artifact.inline_data.data) if hasattr(final_artifact,
-                                                                                                  'inline_data') and final_artifact.inline_data else 0)
+                # Serialize the data in a thread so the worker stays responsive (health
+                # checks, other tasks) while the annotated variants are pickled
+                final_artifact = await asyncio.to_thread(serialize_data_to_artifact, variants)
+                # The pickle is self-contained, so the objects can go before the upload
+                del variants
 
                 # Save to artifact service
                 version = await self.artifact_service.save_artifact(
@@ -290,26 +460,28 @@ class VepRunnerService:
                                  version=version,
                                  expected_path=f"{app_name}/{user_id}/{session_id}/{output_artifact}/{version}")
 
-                # Verify the save by attempting to load
-                task_logger.info("Verifying saved artifact can be loaded...")
-                try:
-                    verify_artifact = await self.artifact_service.load_artifact(
-                        app_name=app_name,
-                        user_id=user_id,
-                        session_id=session_id,
-                        filename=output_artifact
-                    )
-                    if verify_artifact:
-                        verify_data = deserialize_data_from_artifact(verify_artifact)
-                        task_logger.info("Artifact verification successful",
-                                         loaded_variant_count=len(verify_data))
-                    else:
-                        task_logger.error("Artifact verification failed - loaded artifact is None")
-
-                except Exception as verify_error:
-                    task_logger.error("Artifact verification failed",
-                                      error=str(verify_error),
-                                      artifact_name=output_artifact)
+                # Verifying the save re-downloads and deserializes the whole artifact,
+                # so it is a debugging aid enabled with VEP_VERIFY_SAVE=1
+                if verify_save:
+                    task_logger.info("Verifying saved artifact can be loaded...")
+                    try:
+                        verify_artifact = await self.artifact_service.load_artifact(
+                            app_name=app_name,
+                            user_id=user_id,
+                            session_id=session_id,
+                            filename=output_artifact
+                        )
+                        if verify_artifact:
+                            verify_data = deserialize_data_from_artifact(verify_artifact)
+                            task_logger.info("Artifact verification successful",
+                                             loaded_variant_count=len(verify_data))
+                        else:
+                            task_logger.error("Artifact verification failed - loaded artifact is None")
+
+                    except Exception as verify_error:
+                        task_logger.error("Artifact verification failed",
+                                          error=str(verify_error),
+                                          artifact_name=output_artifact)
 
             except Exception as save_error:
                 task_logger.error("Failed to save artifact",
@@ -322,22 +494,21 @@ class VepRunnerService:
                                   traceback=traceback.format_exc())
                 raise
 
-            # 6. Update Firestore: Mark task as "completed"
-            await task_ref.update({
+            # 6-7. Mark task "completed" and update session metadata in one commit
+            batch = self.db.batch()
+            batch.update(task_ref, {
                 "status": "completed",
                 "updatedAt": firestore_v1.SERVER_TIMESTAMP,
                 "output_artifact": output_artifact
             })
-            task_logger.info("VEP task finished successfully.")
-
-            # 7. Update session metadata to reflect VEP completion
             metadata_service = SessionMetadataService(self.db)
-            await metadata_service.update_metadata(
-                session_id=session_id,
+            await metadata_service.commit_updates(
+                session_id,
+                batch=batch,
                 vep_status="completed",
                 status="analyzing"  # Ready for report generation
             )
-            task_logger.info("Updated session metadata with VEP completion status")
+            task_logger.info("VEP task finished successfully; session metadata updated.")
 
         except Exception as e:
             task_logger.exception("VEP background task failed.")
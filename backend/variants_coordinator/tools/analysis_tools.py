@@ -9,7 +9,6 @@ import uuid
 import re
 import time
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Optional
 
 import structlog
@@ -28,8 +27,15 @@ from ..services.session_metadata_service import SessionMetadataService
 
 logger = structlog.get_logger(__name__)
 
-# Create a thread pool for blocking I/O operations
-executor = ThreadPoolExecutor(max_workers=4)
+# Fenced code block in an LLM response, optionally tagged as JSON
+_JSON_CODE_BLOCK = re.compile(r"```(?:json)?\s*([\s\S]*?)```", re.IGNORECASE)
+_JSON_DECODER = json.JSONDecoder()
+_EXPECTED_ASSESSMENT_KEYS = ("clinical_summary", "actionable_recommendations", "critical_key_findings")
+
+# Fixups for common LLM JSON mistakes
+_TRAILING_COMMA_OBJ = re.compile(r',\s*}')
+_TRAILING_COMMA_ARR = re.compile(r',\s*]')
+_JSON_STRING_BODY = re.compile(r'"(?:[^"\\]|\\.)*"')
 
 
 def extract_json_from_response(response_text: str) -> Optional[Dict]:
@@ -78,61 +84,29 @@ def extract_json_from_response(response_text: str) -> Optional[Dict]:
         pass
 
     # Strategy 3: Extract from Markdown code blocks
-    json_patterns = [
-        r"```(?:json|JSON)?\s*\n?([\s\S]*?)```",
-        r"```(?:json|JSON)?\s*([\s\S]*?)```",
-    ]
+    for match in _JSON_CODE_BLOCK.finditer(response_text):
+        try:
+            match_cleaned = match.group(1).strip()
+            if match_cleaned.startswith('{') and match_cleaned.endswith('}'):
+                result = json.loads(match_cleaned)
+                return result
+        except json.JSONDecodeError:
+            continue
 
-    for pattern in json_patterns:
-        matches = re.findall(pattern, response_text, re.DOTALL | re.IGNORECASE)
-        if matches:
-            for match in matches:
-                try:
-                    match_cleaned = match.strip()
-                    if match_cleaned.startswith('{') and match_cleaned.endswith('}'):
-                        result = json.loads(match_cleaned)
-                        return result
-                except json.JSONDecodeError:
-                    continue
-
-    # Strategy 4: Find JSON object boundaries with improved parsing
-    start_idx = -1
-    end_idx = -1
-    brace_count = 0
-    in_string = False
-    escape_next = False
-
-    for i, char in enumerate(response_text):
-        if not escape_next:
-            if char == '\\' and in_string:
-                escape_next = True
-                continue
-            elif char == '"':
-                in_string = not in_string
-        else:
-            escape_next = False
+    # Strategy 4: Decode the first complete object at each '{' with the C decoder,
+    # which also finds where it ends, so no Python-level brace scanning is needed
+    start_idx = response_text.find('{')
+    while start_idx != -1:
+        try:
+            result, end_idx = _JSON_DECODER.raw_decode(response_text, start_idx)
+        except json.JSONDecodeError:
+            start_idx = response_text.find('{', start_idx + 1)
             continue
 
-        if not in_string:
-            if char == '{':
-                if brace_count == 0:
-                    start_idx = i
-                brace_count += 1
-            elif char == '}':
-                brace_count -= 1
-                if brace_count == 0 and start_idx != -1:
-                    end_idx = i + 1
-                    try:
-                        json_str = response_text[start_idx:end_idx]
-                        result = json.loads(json_str)
-
-                        # Validate it has expected structure for clinical assessment
-                        expected_keys = ["clinical_summary", "actionable_recommendations", "critical_key_findings"]
-                        if any(key in result for key in expected_keys):
-                            return result
-                    except json.JSONDecodeError:
-                        pass
-                    start_idx = -1
+        # Validate it has expected structure for clinical assessment
+        if isinstance(result, dict) and any(key in result for key in _EXPECTED_ASSESSMENT_KEYS):
+            return result
+        start_idx = response_text.find('{', end_idx)
 
     # Strategy 5: Fix common JSON errors
     json_start = response_text.find('{')
@@ -145,11 +119,12 @@ def extract_json_from_response(response_text: str) -> Optional[Dict]:
         fixed_json = potential_json
 
         # Remove trailing commas
-        fixed_json = re.sub(r',\s*}', '}', fixed_json)
-        fixed_json = re.sub(r',\s*]', ']', fixed_json)
+        fixed_json = _TRAILING_COMMA_OBJ.sub('}', fixed_json)
+        fixed_json = _TRAILING_COMMA_ARR.sub(']', fixed_json)
 
-        # Fix unescaped newlines in strings
-        fixed_json = re.sub(r'("(?:[^"\\]|\\.)*")', lambda m: m.group(1).replace('\n', '\\n'), fixed_json)
+        # Fix unescaped newlines in strings; the per-match callback only runs if there are any
+        if '\n' in fixed_json:
+            fixed_json = _JSON_STRING_BODY.sub(lambda m: m.group().replace('\n', '\\n'), fixed_json)
 
         try:
             result = json.loads(fixed_json)
@@ -207,21 +182,18 @@ async def load_and_parse_vcf(gcs_path: str, tool_context: ToolContext) -> Dict[s
     tool_logger.info("Executing tool", gcs_path=gcs_path)
 
     try:
-        # Run the blocking GCS operations in a thread pool
-        loop = asyncio.get_event_loop()
-
         # Define a function to run in thread
         def download_and_parse():
             gcs_client = GCSClient()
-            vcf_content = gcs_client.read_vcf(gcs_path)
             vcf_parser = VCFParser()
-            variants = list(vcf_parser.parse_vcf_content(vcf_content))
+            # Stream lines straight from GCS so the whole file is never held as one string
+            variants = list(vcf_parser.parse_vcf_stream(gcs_client.iter_vcf_lines(gcs_path)))
             stats = vcf_parser.get_summary_stats(variants)  # Calculate stats here
             return variants, stats
 
-        # Run in thread pool to avoid blocking
+        # Run in the loop's default executor (sized by settings.thread_pool_size) to avoid blocking
         tool_logger.info("Downloading and parsing VCF file in background thread...")
-        variants, stats = await loop.run_in_executor(executor, download_and_parse)
+        variants, stats = await asyncio.to_thread(download_and_parse)
         tool_logger.info(f"Successfully parsed {len(variants)} variants")
 
         # Yield control after heavy operation completes
@@ -304,7 +276,17 @@ async def start_vep_annotation(tool_context: ToolContext) -> Dict[str, Any]:
             "output_artifact": output_artifact_name,
             "context": {"session_id": session_id, "user_id": user_id, "app_name": app_name}
         }
-        await task_ref.set(task_data)
+        # Create the task document and record it in the session metadata in one
+        # commit; it has to land before dispatch, since the worker reads it
+        batch = clients.db.batch()
+        batch.set(task_ref, task_data)
+        await SessionMetadataService(clients.db).commit_updates(
+            session_id,
+            batch=batch,
+            vep_task_id=task_id,
+            vep_status="pending",
+            status="processing"
+        )
         tool_logger.info("Created task document in Firestore.", task_id=task_id)
 
         tool_context.state['vep_task_id'] = task_id
@@ -324,19 +306,9 @@ async def start_vep_annotation(tool_context: ToolContext) -> Dict[str, Any]:
             }
         }
 
-        response = clients.tasks_client.create_task(request={'parent': parent, 'task': task})
+        response = await clients.tasks_client.create_task(request={'parent': parent, 'task': task})
         tool_logger.info("Dispatched task to Cloud Tasks.", task_name=response.name)
 
-        # Update session metadata with VEP task info
-        if session_id:
-            metadata_service = SessionMetadataService(clients.db)
-            await metadata_service.update_metadata(
-                session_id=session_id,
-                vep_task_id=task_id,
-                vep_status="pending",
-                status="processing"
-            )
-
         return {"status": "pending", "task_id": task_id,
                 "message": "VEP annotation has been dispatched for background processing."}
 
@@ -484,7 +456,17 @@ async def start_report_generation(tool_context: ToolContext, analysis_mode: str
                 "analysis_mode": analysis_mode  # Pass analysis mode to background task
             }
         }
-        await task_ref.set(task_data)
+        # Task document and session metadata go in one commit, before dispatch
+        batch = clients.db.batch()
+        batch.set(task_ref, task_data)
+        await SessionMetadataService(clients.db).commit_updates(
+            session_id,
+            batch=batch,
+            report_task_id=task_id,
+            report_status="pending",
+            analysis_mode=analysis_mode,
+            status="generating_report"
+        )
         tool_logger.info(f"Created report generation task in Firestore with {analysis_mode} mode", task_id=task_id)
 
         # Update state
@@ -511,22 +493,11 @@ async def start_report_generation(tool_context: ToolContext, analysis_mode: str
             }
         }
 
-        response = clients.tasks_client.create_task(
+        response = await clients.tasks_client.create_task(
             request={'parent': parent, 'task': task}
         )
         tool_logger.info("Dispatched report generation to Cloud Tasks", task_name=response.name)
 
-        # Update session metadata with mode
-        if session_id:
-            metadata_service = SessionMetadataService(clients.db)
-            await metadata_service.update_metadata(
-                session_id=session_id,
-                report_task_id=task_id,
-                report_status="pending",
-                analysis_mode=analysis_mode,
-                status="generating_report"
-            )
-
         # Construct message based on analysis mode
         if analysis_mode == "clinical":
             mode_message = "Report will focus on ACMG secondary findings (84 medically actionable genes)."